@@ -0,0 +1,179 @@
+# Structured parsing of Gemini cleanliness verdicts.
+# The model is asked for JSON matching VERDICT_SCHEMA. Output that does not parse strictly
+# is repaired locally where possible, otherwise the model is re-asked exactly once before
+# falling back to "Needs Manual Review".
+import json
+import re
+import threading
+
+VALID_STATUSES = ["Clean", "Partially Clean", "Not Clean"]
+FALLBACK_STATUS = "Needs Manual Review"
+MAX_REMARK_LENGTH = 500
+
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "status": {"type": "string", "enum": VALID_STATUSES},
+        "remark": {"type": "string"},
+    },
+    "required": ["status", "remark"],
+}
+
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": VERDICT_SCHEMA,
+}
+
+VERDICT_PROMPT = """
+Analyze the attached image of a hospital room and determine its cleanliness level.
+Respond with a single JSON object and nothing else, with these keys:
+  "status": one of "Clean", "Partially Clean", "Not Clean"
+  "remark": one sentence explaining the status
+Example Response:
+{"status": "Clean", "remark": "The floor is mopped, and all surfaces are clear of debris."}
+"""
+
+REASK_PROMPT = """
+Your previous answer could not be read. Rewrite it as a single JSON object with exactly
+the keys "status" (one of "Clean", "Partially Clean", "Not Clean") and "remark" (one sentence).
+Return only the JSON object.
+Previous answer:
+{previous}
+"""
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL | re.IGNORECASE)
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+class VerdictParseError(ValueError):
+    """Raised when model output cannot be turned into a valid verdict."""
+
+
+def _validate(data):
+    if not isinstance(data, dict):
+        raise VerdictParseError("Verdict is not a JSON object.")
+    status = data.get("status")
+    remark = data.get("remark")
+    if status not in VALID_STATUSES:
+        raise VerdictParseError(f"Unknown status: {status!r}")
+    if not isinstance(remark, str) or not remark.strip():
+        raise VerdictParseError("Verdict has no remark.")
+    return status, remark.strip()[:MAX_REMARK_LENGTH]
+
+
+def parse_strict(text):
+    """Parses output that is exactly the JSON object the schema asks for."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError) as e:
+        raise VerdictParseError(f"Not valid JSON: {e}") from e
+    return _validate(data)
+
+
+def parse_lenient(text):
+    """
+    Recovers a verdict from near-miss output: JSON wrapped in code fences or prose,
+    keys in the wrong case, or the legacy 'Status: ... / Remark: ...' line format.
+    """
+    text = (text or "").strip()
+    fenced = _CODE_FENCE.match(text)
+    if fenced:
+        text = fenced.group(1)
+
+    found = _JSON_OBJECT.search(text)
+    if found:
+        try:
+            data = json.loads(found.group(0))
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            data = {str(k).lower(): v for k, v in data.items()}
+            if isinstance(data.get("status"), str):
+                data["status"] = _normalise_status(data["status"])
+            if "remark" not in data and "remarks" in data:
+                data["remark"] = data["remarks"]
+            return _validate(data)
+
+    status = remark = None
+    for line in text.split("\n"):
+        key, _, value = line.partition(":")
+        key = _strip_emphasis(key).lower()
+        if key == "status":
+            status = _normalise_status(_strip_emphasis(value))
+        elif key in ("remark", "remarks"):
+            remark = _strip_emphasis(value)
+    return _validate({"status": status, "remark": remark})
+
+
+def _strip_emphasis(text):
+    """Removes surrounding markdown bold/italic markers, e.g. '**Status:** Clean' splits into '**Status' and '** Clean'."""
+    return text.strip().strip("*_").strip()
+
+
+def _normalise_status(value):
+    for status in VALID_STATUSES:
+        if value.strip().rstrip(".").lower() == status.lower():
+            return status
+    return value
+
+
+class VerdictCounters:
+    """Thread-safe tally of how each verdict was obtained."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"parsed": 0, "repaired": 0, "fallback": 0, "reasks": 0}
+
+    def add(self, outcome):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        total = counts["parsed"] + counts["repaired"] + counts["fallback"]
+        counts["success_rate"] = round((counts["parsed"] + counts["repaired"]) / total, 4) if total else 0.0
+        return counts
+
+
+counters = VerdictCounters()
+
+
+def resolve_verdict(text, reask=None):
+    """
+    Turns raw model output into (status, remark, outcome).
+    'reask' is an optional callable taking the bad output and returning new text;
+    it is called at most once. Outcome is 'parsed', 'repaired' or 'fallback'.
+    """
+    status, remark, outcome = _resolve(text, reask)
+    counters.add(outcome)
+    return status, remark, outcome
+
+
+def _resolve(text, reask):
+    try:
+        status, remark = parse_strict(text)
+        return status, remark, "parsed"
+    except VerdictParseError:
+        pass
+
+    try:
+        status, remark = parse_lenient(text)
+        return status, remark, "repaired"
+    except VerdictParseError:
+        pass
+
+    if reask is not None:
+        counters.add("reasks")
+        try:
+            retry_text = reask(text)
+            try:
+                status, remark = parse_strict(retry_text)
+            except VerdictParseError:
+                status, remark = parse_lenient(retry_text)
+            return status, remark, "repaired"
+        except Exception as e:
+            print(f"Verdict re-ask did not produce a usable answer: {e}")
+
+    remark = (text or "").strip()[:MAX_REMARK_LENGTH] or "Could not parse AI response."
+    return FALLBACK_STATUS, remark, "fallback"
@@ -0,0 +1,124 @@
+# Room- and cleaner-level performance metrics over cleaning records.
+# Records are converted once into integer-coded NumPy columns (rooms and cleaners factorized
+# to small ints), and every metric is then a np.bincount group-by with no per-row Python.
+import numpy as np
+
+AI_STATUSES = ["Clean", "Partially Clean", "Not Clean", "Needs Manual Review"]
+DECISIONS = ["Pending", "Approved", "Rework"]
+_UNKNOWN = -1
+
+
+def _factorize(values):
+    """Maps each distinct value to a small integer; returns (codes, labels)."""
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(v, len(lookup)) for v in values), dtype=np.int64, count=len(values))
+    return codes, list(lookup)
+
+
+def _encode(values, vocabulary):
+    """Codes values by their position in a fixed vocabulary, with -1 for anything else."""
+    lookup = {name: i for i, name in enumerate(vocabulary)}
+    return np.fromiter((lookup.get(v, _UNKNOWN) for v in values), dtype=np.int8, count=len(values))
+
+
+def to_columns(records):
+    """
+    Turns a list of 'cleaning_records' rows into integer-coded NumPy columns.
+    Room ids are free text and repeat across hospitals ("ICU-101"), so rooms are keyed by (hospital_id, room_id).
+    """
+    room_codes, room_labels = _factorize([(r.get("hospital_id"), str(r.get("room_id"))) for r in records])
+    cleaner_codes, cleaner_labels = _factorize([str(r.get("cleaner_id")) for r in records])
+    return {
+        "room": (room_codes, room_labels),
+        "cleaner": (cleaner_codes, cleaner_labels),
+        "ai": _encode([r.get("cleanliness_status") for r in records], AI_STATUSES),
+        "decision": _encode([r.get("manager_approval_status") for r in records], DECISIONS),
+    }
+
+
+def _disagreement_mask(ai, decision):
+    """
+    True where the AI and the manager reached opposite conclusions:
+    the AI said 'Clean' but the manager sent it back, or the AI said 'Not Clean' and it was approved.
+    """
+    clean, not_clean = AI_STATUSES.index("Clean"), AI_STATUSES.index("Not Clean")
+    approved, rework = DECISIONS.index("Approved"), DECISIONS.index("Rework")
+    return ((ai == clean) & (decision == rework)) | ((ai == not_clean) & (decision == approved))
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), 0.0)
+
+
+def _group_metrics(group, columns, limit, sort_by, describe):
+    """Shared group-by for rooms and cleaners: submission, review, rework and disagreement counts."""
+    codes, labels = group
+    if len(codes) == 0:
+        return []
+    groups = len(labels)
+    decision = columns["decision"]
+
+    approved = np.bincount(codes, weights=decision == DECISIONS.index("Approved"), minlength=groups)
+    rework = np.bincount(codes, weights=decision == DECISIONS.index("Rework"), minlength=groups)
+    submissions = np.bincount(codes, minlength=groups)
+    disagreements = np.bincount(codes, weights=_disagreement_mask(columns["ai"], decision), minlength=groups)
+    reviewed = approved + rework
+
+    metrics = {
+        "submissions": submissions,
+        "reviewed": reviewed.astype(np.int64),
+        "approved": approved.astype(np.int64),
+        "rework": rework.astype(np.int64),
+        "approval_ratio": _ratio(approved, reviewed),
+        "rework_rate": _ratio(rework, reviewed),
+        "disagreement_rate": _ratio(disagreements, reviewed),
+    }
+    order = np.argsort(-metrics[sort_by], kind="stable")[:limit]
+    return [
+        {**describe(labels[i]), **{name: _plain(values[i]) for name, values in metrics.items()}}
+        for i in order
+    ]
+
+
+def _plain(value):
+    value = value.item()
+    return round(value, 4) if isinstance(value, float) else value
+
+
+def room_metrics(columns, limit=100, sort_by="rework_rate"):
+    """Per-room re-clean (rework) rates, worst rooms first by default."""
+    return _group_metrics(columns["room"], columns, limit, sort_by,
+                          lambda label: {"id": label[1], "hospital_id": label[0]})
+
+
+def cleaner_metrics(columns, limit=100, sort_by="approval_ratio"):
+    """Per-cleaner approval ratios."""
+    return _group_metrics(columns["cleaner"], columns, limit, sort_by, lambda label: {"id": label})
+
+
+def ai_agreement(columns):
+    """Confusion matrix of AI verdict against manager decision, plus overall disagreement."""
+    ai, decision = columns["ai"], columns["decision"]
+    known = (ai >= 0) & (decision >= 0)
+    matrix = np.bincount(
+        ai[known].astype(np.int64) * len(DECISIONS) + decision[known],
+        minlength=len(AI_STATUSES) * len(DECISIONS),
+    ).reshape(len(AI_STATUSES), len(DECISIONS))
+
+    reviewed = int((decision == DECISIONS.index("Approved")).sum() + (decision == DECISIONS.index("Rework")).sum())
+    disagreements = int(_disagreement_mask(ai, decision).sum())
+    return {
+        "records": int(len(ai)),
+        "reviewed": reviewed,
+        "disagreements": disagreements,
+        "disagreement_rate": round(disagreements / reviewed, 4) if reviewed else 0.0,
+        "matrix": {
+            status: {d: int(matrix[i, j]) for j, d in enumerate(DECISIONS)}
+            for i, status in enumerate(AI_STATUSES)
+        },
+    }
+
+
+ROOM_SORT_KEYS = ("rework_rate", "submissions", "disagreement_rate")
+CLEANER_SORT_KEYS = ("approval_ratio", "submissions", "rework_rate", "disagreement_rate")
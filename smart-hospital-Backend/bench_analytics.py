@@ -0,0 +1,39 @@
+# Benchmark for the analytics group-bys on synthetic cleaning records.
+# Only the in-process work is timed. Fetching the rows costs one database round trip per
+# page on top of this, which is why ANALYTICS_MAX_ROWS bounds how many are pulled.
+# Run with: python bench_analytics.py
+import math
+import random
+import time
+import analytics
+
+PAGE_SIZE = 1000  # Matches storage.ANALYTICS_PAGE_SIZE
+
+
+def make_records(count, rooms=2000, cleaners=300):
+    statuses = analytics.AI_STATUSES
+    decisions = analytics.DECISIONS
+    return [{
+        "room_id": f"WARD-{random.randrange(rooms):04d}",
+        "cleaner_id": f"cleaner-{random.randrange(cleaners):03d}",
+        "cleanliness_status": random.choice(statuses),
+        "manager_approval_status": random.choice(decisions),
+    } for _ in range(count)]
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<16}: {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    random.seed(7)
+    for size in (100_000, 1_000_000):
+        records = make_records(size)
+        print(f"\n--- {size:,} records ({math.ceil(size / PAGE_SIZE):,} database pages to fetch, not timed) ---")
+        columns = timed("to_columns", lambda: analytics.to_columns(records))
+        timed("room_metrics", lambda: analytics.room_metrics(columns))
+        timed("cleaner_metrics", lambda: analytics.cleaner_metrics(columns))
+        timed("ai_agreement", lambda: analytics.ai_agreement(columns))
@@ -0,0 +1,76 @@
+# Benchmark for list-endpoint payloads: serialization time and wire size.
+# Run with: python bench_responses.py
+import gzip
+import json
+import random
+import time
+import uuid
+import responses
+
+REMARKS = [
+    "The floor is mopped, and all surfaces are clear of debris.",
+    "The bed linen is changed but there are visible stains near the sink and the bin is overflowing.",
+    "Most surfaces are clean, although the window sill and the bedside table still have dust on them.",
+]
+STATUSES = ["Clean", "Partially Clean", "Not Clean"]
+
+
+def make_records(count):
+    """Builds rows shaped like 'cleaning_records' as returned by /dashboard."""
+    hospital_id = str(uuid.uuid4())
+    return [{
+        "id": i,
+        "room_id": f"ICU-{i % 400:03d}",
+        "cleaner_id": str(uuid.uuid4()),
+        "before_photo_url": "http://example.com/before_placeholder.jpg",
+        "after_photo_url": f"https://your-bucket-url.com/photos/room_{i}.jpg",
+        "cleanliness_status": random.choice(STATUSES),
+        "ai_remarks": random.choice(REMARKS),
+        "manager_approval_status": "Pending",
+        "hospital_id": hospital_id,
+        "created_at": f"2026-10-{1 + i % 28:02d}T08:{i % 60:02d}:00+00:00",
+    } for i in range(count)]
+
+
+def timed(func, repeat=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def run(count):
+    payload = {"success": True, "data": make_records(count)}
+    print(f"\n--- {count} rows ---")
+
+    stdlib_body, stdlib_ms = timed(lambda: json.dumps(payload).encode("utf-8"))
+    print(f"json (stdlib)   : {len(stdlib_body):>10,} bytes  {stdlib_ms:8.2f} ms")
+    if responses.orjson is not None:
+        fast_body, fast_ms = timed(lambda: responses.orjson.dumps(payload))
+        print(f"orjson          : {len(fast_body):>10,} bytes  {fast_ms:8.2f} ms")
+    else:
+        fast_body = stdlib_body
+        print("orjson          : not installed")
+
+    gz_body, gz_ms = timed(lambda: gzip.compress(fast_body, compresslevel=responses.GZIP_LEVEL))
+    print(f"+ gzip          : {len(gz_body):>10,} bytes  {gz_ms:8.2f} ms")
+    if responses.brotli is not None:
+        br_body, br_ms = timed(lambda: responses.brotli.compress(fast_body, quality=responses.BROTLI_QUALITY))
+        print(f"+ brotli        : {len(br_body):>10,} bytes  {br_ms:8.2f} ms")
+    else:
+        print("+ brotli        : not installed")
+
+    fields = "id,room_id,cleanliness_status,created_at"
+    slim = responses.select_fields(payload, fields)
+    slim_body = json.dumps(slim).encode("utf-8")
+    slim_gz = gzip.compress(slim_body, compresslevel=responses.GZIP_LEVEL)
+    print(f"fields={fields}: {len(slim_body):>10,} bytes raw, {len(slim_gz):,} gzipped")
+
+
+if __name__ == "__main__":
+    random.seed(42)
+    for size in (1_000, 10_000):
+        run(size)
@@ -37,3 +37,72 @@ try:
 except Exception as e:
     print(f"Error initializing Gemini model: {e}", file=sys.stderr)
     sys.exit(1)
+
+# --- Pending Review Index Settings ---
+# How often (seconds) each worker re-syncs its in-memory pending list with the database,
+# and how much it is allowed to hold before falling back to direct queries.
+pending_index_reconcile_seconds = int(os.getenv("PENDING_INDEX_RECONCILE_SECONDS", "30"))
+pending_index_max_hospitals = int(os.getenv("PENDING_INDEX_MAX_HOSPITALS", "64"))
+pending_index_max_records = int(os.getenv("PENDING_INDEX_MAX_RECORDS", "5000"))
+
+# --- Response Compression Settings ---
+# Bodies smaller than this (bytes) are sent uncompressed; compressing them costs more than it saves.
+compression_min_size = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# --- Shared Cache Settings ---
+# "sqlite" shares one cache file between all gunicorn workers on this host,
+# "redis" uses REDIS_URL, and "local" keeps a separate cache in each worker.
+cache_backend = os.getenv("CACHE_BACKEND", "sqlite")
+cache_sqlite_path = os.getenv("CACHE_SQLITE_PATH", "/tmp/smart_hospital_cache.db")
+redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+hospitals_cache_ttl = int(os.getenv("HOSPITALS_CACHE_TTL", "300"))
+
+# --- AI Verdict Settings ---
+# When set, every raw Gemini verdict is appended to this JSONL file so it can be
+# re-parsed offline with replay_verdicts.py.
+ai_response_log_path = os.getenv("AI_RESPONSE_LOG_PATH")
+# Time limit for each Gemini call. A photo check makes at most two calls (the verdict and one
+# re-ask), and both run under the submission's idempotency lock (sync.IDEMPOTENCY_LOCK_SECONDS),
+# so twice this plus TENANT_WAIT_SECONDS must stay below that lock's lifetime.
+gemini_timeout_seconds = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "45"))
+
+# --- Profiling Settings ---
+# Off by default. When enabled, commissioner requests sent with "X-Profile: 1" are always profiled and
+# PROFILE_SAMPLE_RATE (0.0-1.0) of all other requests are profiled at random.
+profiling_enabled = os.getenv("PROFILING_ENABLED", "0") == "1"
+profile_sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+memory_tracking_enabled = os.getenv("MEMORY_TRACKING", "0") == "1"
+
+# --- Photo Upload Settings ---
+# Resumable uploads are staged in upload_dir until finalized. Requests larger than
+# one photo (plus form overhead) are rejected before Flask reads them.
+upload_dir = os.getenv("UPLOAD_DIR", "/tmp/smart_hospital_uploads")
+max_photo_bytes = int(os.getenv("MAX_PHOTO_BYTES", str(10 * 1024 * 1024)))
+upload_chunk_bytes = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+upload_ttl_seconds = int(os.getenv("UPLOAD_TTL_SECONDS", str(24 * 60 * 60)))
+
+# --- Analytics Settings ---
+# Upper bound on rows pulled for one analytics request (one database round trip per 1000 rows;
+# larger windows are measured over their newest records and marked 'truncated'), how long
+# results are shared between workers, and how long other requests wait for a worker that is
+# already computing the same view.
+analytics_max_rows = int(os.getenv("ANALYTICS_MAX_ROWS", "100000"))
+analytics_cache_ttl = int(os.getenv("ANALYTICS_CACHE_TTL", "120"))
+analytics_load_timeout = int(os.getenv("ANALYTICS_LOAD_TIMEOUT", "120"))
+
+# --- Offline Sync Settings ---
+# How long a finished submission is remembered under its Idempotency-Key, so that
+# replays from a cleaner's offline queue are answered without storing a duplicate.
+idempotency_ttl_seconds = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(48 * 60 * 60)))
+
+# --- Per-Hospital Work Limits ---
+# Concurrent Gemini calls / PDF renders each hospital may run in one worker, how many more
+# may wait (up to TENANT_WAIT_SECONDS) before getting a 429, and the overall cap per worker.
+# With GUNICORN_WORKERS=N in a container each hospital gets N times these (see Dockerfile).
+model_calls_per_hospital = int(os.getenv("MODEL_CALLS_PER_HOSPITAL", "2"))
+model_queue_per_hospital = int(os.getenv("MODEL_QUEUE_PER_HOSPITAL", "2"))
+model_calls_total = int(os.getenv("MODEL_CALLS_TOTAL", "6"))
+reports_per_hospital = int(os.getenv("REPORTS_PER_HOSPITAL", "1"))
+report_queue_per_hospital = int(os.getenv("REPORT_QUEUE_PER_HOSPITAL", "1"))
+reports_total = int(os.getenv("REPORTS_TOTAL", "2"))
+tenant_wait_seconds = float(os.getenv("TENANT_WAIT_SECONDS", "10"))
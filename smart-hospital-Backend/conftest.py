@@ -0,0 +1,9 @@
+# Importing the app modules loads config.py, which refuses to start without these keys.
+# Placeholder values are enough for tests that never reach Supabase or Gemini.
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test.test.test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("JWT_SECRET", "test")
+os.environ.setdefault("CACHE_BACKEND", "local")
@@ -1,7 +1,20 @@
 # This file holds all the business logic (the 5 "functions")
 import storage
-from config import gemini_model, jwt_secret
+from pending_index import pending_index, SORT_OPTIONS as DASHBOARD_SORT_OPTIONS
+import ai_verdict
+import analytics
+import profiling
+import sync
+import tenancy
+from shared_cache import shared_cache
+from config import gemini_model, jwt_secret, ai_response_log_path, gemini_timeout_seconds
+from config import analytics_max_rows, analytics_cache_ttl, analytics_load_timeout
+from config import (
+    model_calls_per_hospital, model_queue_per_hospital, model_calls_total,
+    reports_per_hospital, report_queue_per_hospital, reports_total, tenant_wait_seconds,
+)
 import io
+import json
 import bcrypt
 import jwt
 from datetime import datetime, timedelta, timezone
@@ -11,33 +24,69 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
 
+# --- Per-Hospital Work Limits ---
+# Callers take a slot with `with model_limiter.slot(hospital_id):` and turn TenantBusy into a 429.
+model_limiter = tenancy.TenantLimiter(
+    "photo analysis", model_calls_per_hospital, model_queue_per_hospital, model_calls_total, tenant_wait_seconds
+)
+report_limiter = tenancy.TenantLimiter(
+    "report", reports_per_hospital, report_queue_per_hospital, reports_total, tenant_wait_seconds
+)
+
+# Two Gemini calls plus the wait for a slot must finish before a replay could take the submission's lock
+if 2 * gemini_timeout_seconds + tenant_wait_seconds >= sync.IDEMPOTENCY_LOCK_SECONDS:
+    print(f"WARNING: GEMINI_TIMEOUT_SECONDS={gemini_timeout_seconds} is too long for the "
+          f"{sync.IDEMPOTENCY_LOCK_SECONDS}s idempotency lock; a retried submission could be saved twice.")
+
+def get_tenant_stats():
+    """Returns per-hospital slot usage for this worker's limiters."""
+    return {"success": True, "data": [model_limiter.stats(), report_limiter.stats()]}
+
 # --- Function 1: Photo Verification Logic ---
-AI_PROMPT = """
-Analyze the attached image of a hospital room and determine its cleanliness level.
-Provide a 'status' (Clean, Partially Clean, Not Clean) and a one-sentence 'remark'.
-Example Response:
-Status: Clean
-Remark: The floor is mopped, and all surfaces are clear of debris.
-"""
+def _record_ai_response(text, outcome, reask_texts):
+    """
+    Appends the raw model output to the replay corpus, if one is configured.
+    The re-ask answer is kept too, so an offline replay can reach the same outcome as the live call.
+    """
+    if not ai_response_log_path:
+        return
+    entry = {"text": text, "outcome": outcome, "reasked": bool(reask_texts),
+             "reask_text": reask_texts[0] if reask_texts else None}
+    try:
+        with open(ai_response_log_path, "a", encoding="utf-8") as log:
+            log.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Could not record AI response: {e}")
+
+def _reask_model(previous_text):
+    """Asks the model once more to restate a malformed answer as JSON (text only, no image)."""
+    response = gemini_model.generate_content(
+        [ai_verdict.REASK_PROMPT.format(previous=previous_text)],
+        generation_config=ai_verdict.GENERATION_CONFIG,
+        request_options={"timeout": gemini_timeout_seconds}
+    )
+    return response.text
 
+@profiling.track_memory("analyze_room_image")
 def analyze_room_image(image_bytes: bytes):
     try:
         image = Image.open(io.BytesIO(image_bytes))
-        response = gemini_model.generate_content([AI_PROMPT, image])
-        
-        status = "Needs Manual Review"
-        remarks = "Could not parse AI response."
-        
-        for line in response.text.strip().split('\n'):
-            if line.lower().startswith('status:'):
-                status = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('remark:'):
-                remarks = line.split(':', 1)[1].strip()
-        
-        if status not in ['Clean', 'Partially Clean', 'Not Clean']:
-             remarks = response.text.strip()
-             status = "Needs Manual Review"
-             
+        response = gemini_model.generate_content(
+            [ai_verdict.VERDICT_PROMPT, image],
+            generation_config=ai_verdict.GENERATION_CONFIG,
+            request_options={"timeout": gemini_timeout_seconds}
+        )
+
+        reask_texts = []
+
+        def reask(previous_text):
+            reask_texts.append(None)  # Marks the attempt even if the call itself fails
+            reask_texts[-1] = _reask_model(previous_text)
+            return reask_texts[-1]
+
+        status, remarks, outcome = ai_verdict.resolve_verdict(response.text, reask=reask)
+        _record_ai_response(response.text, outcome, reask_texts)
+
         return {"success": True, "status": status, "remarks": remarks}
     except Exception as e:
         # This print statement is for debugging
@@ -46,10 +95,18 @@ def analyze_room_image(image_bytes: bytes):
         print("--- END GEMINI API ERROR ---")
         return {"success": False, "error": "Failed to analyze image."}
 
+def get_ai_verdict_stats():
+    """Returns how often model output parsed cleanly, needed repair, or fell back to manual review."""
+    return {"success": True, "data": ai_verdict.counters.snapshot()}
+
 # --- Function 2: Dashboard Logic ---
-def get_dashboard_data(hospital_id):
-    """Gets all cleaning records pending approval for a specific hospital."""
-    return storage.get_pending_records(hospital_id)
+def get_dashboard_data(hospital_id, sort="oldest", ai_status=None):
+    """Gets all cleaning records pending approval for a specific hospital, served from the in-memory index."""
+    return pending_index.get_pending(hospital_id, storage.get_pending_records, sort=sort, ai_status=ai_status)
+
+def get_dashboard_index_stats():
+    """Returns hit-rate and size counters for this worker's pending-review index."""
+    return {"success": True, "data": pending_index.stats()}
 
 def process_manager_approval(record_id, decision, hospital_id):
     """Processes a manager's approval or rework decision for their hospital."""
@@ -59,6 +116,7 @@ def process_manager_approval(record_id, decision, hospital_id):
 # --- Function 3: Report Generation Logic ---
 # Replace the entire function in index.py with this one
 
+@profiling.track_memory("generate_pdf_report")
 def generate_pdf_report(records_data: list, user_role: str, hospital_name: str = None):
     """Takes a list of records and generates a role-specific PDF file with text wrapping."""
     buffer = io.BytesIO()
@@ -129,6 +187,39 @@ def generate_pdf_report(records_data: list, user_role: str, hospital_name: str =
     buffer.seek(0)
     return buffer.getvalue()
 
+# --- Function 3b: Performance Analytics Logic ---
+ANALYTICS_VIEWS = ("rooms", "cleaners", "ai_agreement")
+
+def _compute_analytics(view, start, end, hospital_id, limit, sort_by):
+    result = storage.get_records_in_window(start, end, hospital_id, max_rows=analytics_max_rows)
+    if not result["success"]:
+        return result
+
+    columns = analytics.to_columns(result["data"])
+    if view == "rooms":
+        data = analytics.room_metrics(columns, limit=limit, sort_by=sort_by or "rework_rate")
+    elif view == "cleaners":
+        data = analytics.cleaner_metrics(columns, limit=limit, sort_by=sort_by or "approval_ratio")
+    else:
+        data = analytics.ai_agreement(columns)
+
+    return {
+        "success": True, "data": data,
+        "window": {"start": start.isoformat(), "end": end.isoformat()},
+        # The newest records are kept when a window is too large; this is the part actually measured
+        "covered": {"start": result["covered_start"], "end": end.isoformat()},
+        "records": len(result["data"]), "truncated": result["truncated"],
+    }
+
+def get_performance_analytics(view, start, end, hospital_id=None, limit=100, sort_by=None):
+    """Computes one analytics view over [start, end); results are shared between workers for a short time."""
+    key = f"analytics:{view}:{hospital_id}:{start.isoformat()}:{end.isoformat()}:{limit}:{sort_by}"
+    return shared_cache.get_or_load(
+        key, lambda: _compute_analytics(view, start, end, hospital_id, limit, sort_by),
+        ttl=analytics_cache_ttl, should_cache=lambda result: result["success"],
+        load_timeout=analytics_load_timeout
+    )
+
 # --- Function 4: User Auth Logic ---
 # Add hospital_id to the function signature
 def register_new_user(email, password, role, full_name, hospital_id=None):
@@ -173,9 +264,19 @@ def assign_new_task(room_id, cleaner_id, assigned_by_id, assignment_date, notes)
         room_id, cleaner_id, assigned_by_id, assignment_date, notes
     )
 
-def get_cleaner_tasks(cleaner_id):
-    """Gets all tasks for a specific cleaner."""
-    return storage.get_tasks_for_cleaner(cleaner_id)
+def get_cleaner_tasks(cleaner_id, cursor=None):
+    """
+    Gets tasks for a specific cleaner. With a cursor from an earlier call, only tasks
+    changed since then are returned. Rows at the cursor's exact timestamp are sent again,
+    so clients merge by task id.
+    """
+    changed_since = sync.decode_cursor(cursor) if cursor else None
+    result = storage.get_tasks_for_cleaner(cleaner_id, changed_since=changed_since)
+    if not result["success"]:
+        return result
+    result["cursor"] = sync.next_cursor(result["data"], previous_cursor=cursor)
+    result["full"] = cursor is None
+    return result
 
 # --- Function 6: Manager Task Logic ---
 def assign_manager_task(assigned_by_id, assigned_to_id, description, due_date):
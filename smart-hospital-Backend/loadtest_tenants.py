@@ -0,0 +1,115 @@
+# Load test for per-hospital isolation, without Supabase or Gemini.
+# Each process stands in for one gunicorn gthread worker, with a thread pool and its own
+# TenantLimiter. A noisy hospital bursts photo analyses while a quiet hospital sends a steady
+# trickle, and both hospitals' results are compared across four setups:
+#   1. no limits, requests spread round-robin over the workers
+#   2. per-hospital limits, round-robin
+#   3. per-hospital limits, router pins each hospital to a backend instance running
+#      WORKERS_PER_INSTANCE workers; gunicorn then spreads the requests over those workers
+#   4. per-hospital limits, one worker per backend instance (the layout docker-compose.scale.yml
+#      ships), so each hospital reaches exactly one limiter
+# Run with: python loadtest_tenants.py
+import multiprocessing
+import queue
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import tenancy
+
+WORKERS = 4
+WORKERS_PER_INSTANCE = 2  # Only used by setup 3
+THREADS_PER_WORKER = 8
+MODEL_CALL_SECONDS = 0.2  # Simulated Gemini latency; sleeping releases the GIL like network I/O does
+NOISY_REQUESTS = 400
+NOISY_BURST_SECONDS = 2.0
+QUIET_REQUESTS = 15
+QUIET_INTERVAL_SECONDS = 0.15
+
+
+def worker_main(inbox, outbox, limited):
+    if limited:
+        limiter = tenancy.TenantLimiter("photo analysis", per_tenant=2, queue_per_tenant=2,
+                                        max_total=6, wait_seconds=5)
+    else:
+        limiter = tenancy.TenantLimiter("photo analysis", per_tenant=10 ** 6, queue_per_tenant=0,
+                                        max_total=10 ** 6, wait_seconds=5)
+
+    def handle(hospital, sent_at):
+        try:
+            with limiter.slot(hospital):
+                time.sleep(MODEL_CALL_SECONDS)
+            outcome = "ok"
+        except tenancy.TenantBusy:
+            outcome = "rejected"
+        outbox.put((hospital, outcome, time.time() - sent_at))
+
+    with ThreadPoolExecutor(max_workers=THREADS_PER_WORKER) as pool:
+        while True:
+            item = inbox.get()
+            if item is None:
+                break
+            pool.submit(handle, *item)
+
+
+def route(hospital, counter, routing):
+    if routing == "round_robin":
+        return counter % WORKERS
+    if routing == "sticky_instance":
+        # nginx picks the instance by hospital; inside it, requests go to whichever worker accepts first
+        instances = WORKERS // WORKERS_PER_INSTANCE
+        instance = zlib.crc32(hospital.encode("utf-8")) % instances
+        return instance * WORKERS_PER_INSTANCE + counter % WORKERS_PER_INSTANCE
+    return zlib.crc32(hospital.encode("utf-8")) % WORKERS
+
+
+def run_scenario(name, limited, routing):
+    inboxes = [multiprocessing.Queue() for _ in range(WORKERS)]
+    outbox = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker_main, args=(inbox, outbox, limited)) for inbox in inboxes]
+    for w in workers:
+        w.start()
+
+    # Interleave a noisy burst with a quiet trickle on one timeline
+    events = [(i * NOISY_BURST_SECONDS / NOISY_REQUESTS, "hospital-noisy") for i in range(NOISY_REQUESTS)]
+    events += [(0.1 + i * QUIET_INTERVAL_SECONDS, "hospital-quiet") for i in range(QUIET_REQUESTS)]
+    events.sort()
+
+    start = time.time()
+    for counter, (offset, hospital) in enumerate(events):
+        delay = start + offset - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        inboxes[route(hospital, counter, routing)].put((hospital, time.time()))
+
+    results = {"hospital-noisy": [], "hospital-quiet": []}
+    for _ in events:
+        try:
+            hospital, outcome, latency = outbox.get(timeout=120)
+        except queue.Empty:
+            break
+        results[hospital].append((outcome, latency))
+
+    for inbox in inboxes:
+        inbox.put(None)
+    for w in workers:
+        w.join()
+
+    print(f"\n--- {name} ---")
+    for hospital, rows in results.items():
+        served = sorted(latency for outcome, latency in rows if outcome == "ok")
+        rejected = sum(1 for outcome, _ in rows if outcome == "rejected")
+        if served:
+            p50 = served[len(served) // 2] * 1000
+            p99 = served[min(len(served) - 1, int(len(served) * 0.99))] * 1000
+            print(f"{hospital:<15}: served {len(served):>4}, rejected {rejected:>4}, "
+                  f"p50 {p50:8.0f} ms, p99 {p99:8.0f} ms")
+        else:
+            print(f"{hospital:<15}: served    0, rejected {rejected:>4}")
+
+
+if __name__ == "__main__":
+    run_scenario("No limits, round-robin", limited=False, routing="round_robin")
+    run_scenario("Per-hospital limits, round-robin", limited=True, routing="round_robin")
+    run_scenario(f"Per-hospital limits, sticky to instances of {WORKERS_PER_INSTANCE} workers",
+                 limited=True, routing="sticky_instance")
+    run_scenario("Per-hospital limits, sticky to single-worker instances", limited=True, routing="sticky_worker")
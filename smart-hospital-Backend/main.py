@@ -1,20 +1,38 @@
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS  # Import CORS
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import index  # Imports all functions from index.py
+import analytics
 import storage # Imports all functions from storage.py
+import responses
+import profiling
+import uploads
+import sync
+import tenancy
+from shared_cache import shared_cache
 import jwt
-from config import jwt_secret
+from config import jwt_secret, compression_min_size, max_photo_bytes
+from config import profiling_enabled, profile_sample_rate, memory_tracking_enabled
 
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = max_photo_bytes + 64 * 1024  # One photo plus form fields
 CORS(app)  # Initialize CORS to allow all origins
+responses.init_app(app, min_size=compression_min_size)  # orjson encoding + gzip/brotli compression
+# Only the commissioner may force a profile with X-Profile; everyone else is subject to sampling
+profiling.init_app(app, enabled=profiling_enabled, sample_rate=profile_sample_rate,
+                   memory_tracking=memory_tracking_enabled, may_force=lambda: _require_commissioner() is None)
+
+@app.before_request
+def apply_cache_invalidations():
+    # Pick up cache invalidations published by the other workers
+    shared_cache.poll()
 
 # --- Auth Routes ---
 
 # --- Util Route ---
 @app.route("/hospitals", methods=["GET"])
 def get_hospitals_route():
-    result = storage.get_hospitals()
+    result = responses.select_fields(storage.get_hospitals(), request.args.get("fields"))
     return jsonify(result), (200 if result["success"] else 500)
 
 @app.route("/cleaners", methods=["GET"])
@@ -83,7 +101,12 @@ def assign_task_route():
 
 @app.route("/tasks/<string:cleaner_id>", methods=["GET"])
 def get_tasks_route(cleaner_id):
-    result = index.get_cleaner_tasks(cleaner_id)
+    # ?since=<cursor> returns only tasks changed after the cursor from a previous response
+    try:
+        result = index.get_cleaner_tasks(cleaner_id, cursor=request.args.get("since"))
+    except sync.InvalidCursor as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    result = responses.select_fields(result, request.args.get("fields"))
     return jsonify(result), (200 if result["success"] else 500)
 
 # --- Manager Task Routes ---
@@ -101,11 +124,59 @@ def assign_manager_task_route():
 
 @app.route("/manager_tasks/<string:manager_id>", methods=["GET"])
 def get_manager_tasks_route(manager_id):
-    result = index.get_manager_tasks(manager_id)
+    result = responses.select_fields(index.get_manager_tasks(manager_id), request.args.get("fields"))
     return jsonify(result), (200 if result["success"] else 500)
 
 # --- Verification Route ---
-# Replace your entire /verify_room route with this
+def _get_cleaner_hospital(cleaner_id):
+    """Returns (hospital_id, None) for a cleaner, or (None, error response)."""
+    cleaner_data_result = storage.get_user_by_id(cleaner_id)
+    if not cleaner_data_result.get("success") or not cleaner_data_result.get("data"):
+        return None, (jsonify({"error": "Could not verify cleaner's hospital."}), 500)
+
+    hospital_id = cleaner_data_result["data"].get("hospital_id")
+    if not hospital_id:
+        return None, (jsonify({"error": "This cleaner is not assigned to a hospital and cannot submit work."}), 400)
+    return hospital_id, None
+
+def _busy_result(e):
+    return {"error": str(e), "retry_after": e.retry_after}, 429
+
+def _analyze_and_save(room_id, cleaner_id, hospital_id, image_bytes, filename):
+    """Runs the Gemini check on a photo and stores the resulting cleaning record. Returns (body, status)."""
+    try:
+        with index.model_limiter.slot(hospital_id):
+            return _analyze_and_save_in_slot(room_id, cleaner_id, hospital_id, image_bytes, filename)
+    except tenancy.TenantBusy as e:
+        return _busy_result(e)
+
+def _analyze_and_save_in_slot(room_id, cleaner_id, hospital_id, image_bytes, filename):
+    """The body of _analyze_and_save, for callers that already hold a model slot for the hospital."""
+    ai_result = index.analyze_room_image(image_bytes)
+    if not ai_result["success"]:
+        return {"error": ai_result.get("error", "Failed to analyze image.")}, 500
+
+    after_photo_url = f"https://your-bucket-url.com/photos/{filename}"
+    before_photo_url = "http://example.com/before_placeholder.jpg"
+
+    save_result = storage.save_cleaning_record(
+        room_id, cleaner_id, before_photo_url, after_photo_url,
+        ai_result["status"], ai_result["remarks"], hospital_id
+    )
+    return save_result, (201 if save_result["success"] else 500)
+
+def _submit_once(scope, idempotency_key, handler):
+    """Runs a submission handler, deduplicated by the client's Idempotency-Key when one is sent."""
+    if idempotency_key is None:
+        body, status = handler()
+    elif not sync.valid_idempotency_key(idempotency_key):
+        return jsonify({"success": False, "message": "Invalid Idempotency-Key."}), 400
+    else:
+        body, status = sync.run_idempotent(scope, idempotency_key, handler)
+    if status == 429:
+        return jsonify(body), status, {"Retry-After": str(int(body.get("retry_after", 1)))}
+    return jsonify(body), status
+
 @app.route("/verify_room", methods=["POST"])
 def verify_room_endpoint():
     # --- Step 1: Check for the uploaded photo ---
@@ -123,30 +194,93 @@ def verify_room_endpoint():
         return jsonify({"error": "Missing required form data."}), 400
 
     # --- Step 4: Get the cleaner's hospital_id safely ---
-    cleaner_data_result = storage.get_user_by_id(cleaner_id)
-    if not cleaner_data_result.get("success") or not cleaner_data_result.get("data"):
-        return jsonify({"error": "Could not verify cleaner's hospital."}), 500
-    
-    hospital_id = cleaner_data_result["data"].get("hospital_id")
-    if not hospital_id:
-        return jsonify({"error": "This cleaner is not assigned to a hospital and cannot submit work."}), 400
+    hospital_id, error = _get_cleaner_hospital(cleaner_id)
+    if error:
+        return error
+
+    # --- Step 5: Analyze the image with Gemini and save the record (once per Idempotency-Key) ---
+    return _submit_once(
+        f"verify:{cleaner_id}", request.headers.get(sync.IDEMPOTENCY_HEADER),
+        lambda: _analyze_and_save(room_id, cleaner_id, hospital_id, after_photo.read(), after_photo.filename)
+    )
 
-    # --- Step 5: Analyze the image with Gemini ---
-    image_bytes = after_photo.read()
-    ai_result = index.analyze_room_image(image_bytes)
-    
-    if not ai_result["success"]:
-        return jsonify({"error": ai_result.get("error", "Failed to analyze image.")}), 500
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Upload is larger than the {max_photo_bytes // (1024 * 1024)}MB limit."}), 413
+
+# --- Resumable Upload Routes ---
+# POST /uploads (metadata) -> PUT /uploads/<id> (chunks) -> POST /uploads/<id>/finalize.
+# GET /uploads/<id> reports the stored offset so an interrupted client can resume.
+@app.route("/uploads", methods=["POST"])
+def create_upload_route():
+    data = request.get_json(silent=True)
+    if not data or not all(k in data for k in ["room_id", "cleaner_id", "filename", "size"]):
+        return jsonify({"success": False, "message": "Missing required fields."}), 400
 
-    # --- Step 6: Save the record to the database ---
-    after_photo_url = f"https://your-bucket-url.com/photos/{after_photo.filename}"
-    before_photo_url = "http://example.com/before_placeholder.jpg" 
+    # Metadata is checked before a single photo byte is accepted
+    hospital_id, error = _get_cleaner_hospital(data["cleaner_id"])
+    if error:
+        return error
 
-    save_result = storage.save_cleaning_record(
-        room_id, cleaner_id, before_photo_url, after_photo_url,
-        ai_result["status"], ai_result["remarks"], hospital_id
+    result = uploads.create_upload(
+        data["room_id"], data["cleaner_id"], hospital_id,
+        data["filename"], data["size"], data.get("sha256")
     )
-    return jsonify(save_result), (201 if save_result["success"] else 500)
+    return jsonify(result), (201 if result["success"] else 400)
+
+@app.route("/uploads/<string:upload_id>", methods=["GET"])
+def get_upload_route(upload_id):
+    result = uploads.get_upload(upload_id)
+    return jsonify(result), (200 if result["success"] else 404)
+
+@app.route("/uploads/<string:upload_id>", methods=["PUT"])
+def upload_chunk_route(upload_id):
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None or offset < 0:
+        return jsonify({"success": False, "message": "Missing or invalid 'Upload-Offset' header."}), 400
+
+    # Optional "Upload-Checksum: sha256 <hex digest>" for this chunk
+    checksum = None
+    checksum_header = request.headers.get("Upload-Checksum")
+    if checksum_header:
+        algorithm, _, checksum = checksum_header.partition(" ")
+        if algorithm.lower() != "sha256" or not checksum:
+            return jsonify({"success": False, "message": "Only 'sha256 <hex>' checksums are supported."}), 400
+
+    result = uploads.write_chunk(upload_id, offset, request.stream, request.content_length, checksum)
+    code = result.pop("code", 200)
+    return jsonify(result), code
+
+@app.route("/uploads/<string:upload_id>/finalize", methods=["POST"])
+def finalize_upload_route(upload_id):
+    def finalize():
+        upload = uploads.get_upload(upload_id, include_meta=True)
+        if not upload["success"]:
+            return upload, 404
+
+        # Take the hospital's model slot before reading the photo, so a busy hospital is turned
+        # away before any work is done; the upload stays in place for the client's retry
+        try:
+            with index.model_limiter.slot(upload["data"]["hospital_id"]):
+                result = uploads.finalize_upload(upload_id)
+                if not result["success"]:
+                    code = result.pop("code", 400)
+                    return result, code
+
+                meta = result["data"]
+                body, status = _analyze_and_save_in_slot(meta["room_id"], meta["cleaner_id"], meta["hospital_id"],
+                                                         result["image_bytes"], meta["filename"])
+        except tenancy.TenantBusy as e:
+            return _busy_result(e)
+
+        # Keep the photo on any failure so the client can retry finalize without re-uploading
+        if 200 <= status < 300:
+            uploads.discard_upload(upload_id)
+        return body, status
+
+    # The upload id already identifies the submission, so a retried finalize is always deduplicated
+    idempotency_key = request.headers.get(sync.IDEMPOTENCY_HEADER) or upload_id
+    return _submit_once("upload", idempotency_key, finalize)
 
 # --- Dashboard Routes ---
 @app.route("/dashboard", methods=["GET"])
@@ -167,10 +301,102 @@ def get_dashboard_data():
         return jsonify({"error": "Invalid or expired token"}), 401
     # --- END NEW LOGIC ---
 
+    # Optional ordering by age and filtering by the AI's verdict
+    sort = request.args.get("sort", "oldest")
+    if sort not in index.DASHBOARD_SORT_OPTIONS:
+        return jsonify({"success": False, "message": "Invalid sort. Must be 'oldest' or 'newest'."}), 400
+    ai_status = request.args.get("ai_status")
+
     # Pass the manager's hospital_id to get the filtered data
-    result = index.get_dashboard_data(user_hospital_id)
+    result = index.get_dashboard_data(user_hospital_id, sort=sort, ai_status=ai_status)
+    result = responses.select_fields(result, request.args.get("fields"))
     return jsonify(result), (200 if result["success"] else 500)
 
+# --- Operational Stats ---
+# Internal counters (caches, AI parsing, profiling) are only shown to the commissioner.
+def _require_commissioner():
+    """Returns an error response unless the caller is a BMC commissioner, otherwise None."""
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header:
+            return jsonify({"error": "Authorization header missing"}), 401
+
+        token = auth_header.split(" ")[1]
+        payload = jwt.decode(token, jwt_secret, algorithms=["HS256"])
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, IndexError):
+        return jsonify({"error": "Invalid or expired token"}), 401
+
+    if payload.get('role') != 'bmc_commissioner':
+        return jsonify({"error": "Only the commissioner can view operational data."}), 403
+    return None
+
+@app.route("/dashboard/stats", methods=["GET"])
+def get_dashboard_stats():
+    error = _require_commissioner()
+    if error:
+        return error
+
+    return jsonify(index.get_dashboard_index_stats()), 200
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    error = _require_commissioner()
+    if error:
+        return error
+
+    return jsonify({"success": True, "data": shared_cache.stats()}), 200
+
+@app.route("/ai/stats", methods=["GET"])
+def get_ai_stats():
+    error = _require_commissioner()
+    if error:
+        return error
+
+    return jsonify(index.get_ai_verdict_stats()), 200
+
+# --- Admin Profiling Routes ---
+# Profiles and memory reports are per worker; repeat the call to sample the other workers.
+@app.route("/admin/profile", methods=["GET"])
+def get_profile_window_route():
+    error = _require_commissioner()
+    if error:
+        return error
+
+    seconds = request.args.get("seconds", 300, type=int)
+    window = profiling.get_window(seconds)
+    if request.args.get("format") == "folded":
+        return Response(profiling.to_folded_text(window["stacks"]), mimetype="text/plain")
+    return jsonify({"success": True, "data": window}), 200
+
+@app.route("/admin/profile/<string:profile_id>", methods=["GET"])
+def get_profile_route(profile_id):
+    error = _require_commissioner()
+    if error:
+        return error
+
+    profile = profiling.get_profile(profile_id)
+    if not profile:
+        return jsonify({"success": False, "message": "Profile not found on this worker."}), 404
+    if request.args.get("format") == "folded":
+        return Response(profiling.to_folded_text(profile["stacks"]), mimetype="text/plain")
+    return jsonify({"success": True, "data": profile}), 200
+
+@app.route("/admin/memory", methods=["GET"])
+def get_memory_reports_route():
+    error = _require_commissioner()
+    if error:
+        return error
+
+    return jsonify({"success": True, "data": profiling.get_memory_reports(request.args.get("label"))}), 200
+
+@app.route("/admin/tenants", methods=["GET"])
+def get_tenant_stats_route():
+    error = _require_commissioner()
+    if error:
+        return error
+
+    return jsonify(index.get_tenant_stats()), 200
+
 # --- Report Route ---
 @app.route("/report/weekly", methods=["GET"])
 @app.route("/report/weekly", methods=["GET"])
@@ -205,11 +431,12 @@ def generate_report_endpoint():
 
     try:
         # Pass the user's role and hospital name to the PDF generator
-        pdf_content = index.generate_pdf_report(
-            records_data=result["data"],
-            user_role=user_role,
-            hospital_name=report_hospital_name
-        )
+        with index.report_limiter.slot(hospital_to_filter or tenancy.ALL_HOSPITALS):
+            pdf_content = index.generate_pdf_report(
+                records_data=result["data"],
+                user_role=user_role,
+                hospital_name=report_hospital_name
+            )
         # --- END OF NEW LOGIC ---
 
         filename = f"Weekly_Report_{datetime.now().strftime('%Y-%m-%d')}.pdf"
@@ -219,9 +446,66 @@ def generate_report_endpoint():
             mimetype="application/pdf",
             headers={"Content-Disposition": f"attachment;filename={filename}"}
         )
+    except tenancy.TenantBusy as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(int(e.retry_after))}
     except Exception as e:
         return jsonify({"error": f"Failed to generate PDF: {str(e)}"}), 500
     
+# --- Analytics Routes ---
+def _parse_window_bound(value, default):
+    if not value:
+        return default
+    # Python 3.10's fromisoformat() rejects the 'Z' suffix that JavaScript's toISOString() produces
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+@app.route("/analytics/<string:view>", methods=["GET"])
+def get_analytics_route(view):
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header:
+            return jsonify({"error": "Authorization header missing"}), 401
+
+        token = auth_header.split(" ")[1]
+        payload = jwt.decode(token, jwt_secret, algorithms=["HS256"])
+        user_role = payload.get('role')
+        user_hospital_id = payload.get('hospital_id')
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, IndexError):
+        return jsonify({"error": "Invalid or expired token"}), 401
+
+    if view not in index.ANALYTICS_VIEWS:
+        return jsonify({"success": False, "message": f"Unknown view. Must be one of {', '.join(index.ANALYTICS_VIEWS)}."}), 404
+
+    # Managers and deans see their own hospital; the commissioner sees all, or one via ?hospital_id=
+    if user_role == 'bmc_commissioner':
+        hospital_to_filter = request.args.get("hospital_id")
+    elif user_role in ('manager', 'dean') and user_hospital_id:
+        hospital_to_filter = user_hospital_id
+    else:
+        return jsonify({"error": "You are not allowed to view analytics."}), 403
+
+    try:
+        # The default window ends at the start of the next minute: it includes everything saved
+        # so far, and repeated requests within the minute still share a cache entry
+        next_minute = datetime.now(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        end = _parse_window_bound(request.args.get("end"), next_minute)
+        start = _parse_window_bound(request.args.get("start"), end - timedelta(days=30))
+    except ValueError:
+        return jsonify({"success": False, "message": "'start' and 'end' must be ISO-8601 dates."}), 400
+    if start >= end:
+        return jsonify({"success": False, "message": "'start' must be before 'end'."}), 400
+
+    sort_by = request.args.get("sort")
+    allowed_sorts = analytics.ROOM_SORT_KEYS if view == "rooms" else analytics.CLEANER_SORT_KEYS
+    if sort_by and (view == "ai_agreement" or sort_by not in allowed_sorts):
+        return jsonify({"success": False, "message": "Invalid sort for this view."}), 400
+    limit = max(1, min(request.args.get("limit", 100, type=int), 1000))
+
+    result = index.get_performance_analytics(view, start, end, hospital_to_filter, limit, sort_by)
+    return jsonify(result), (200 if result["success"] else 500)
+
 @app.route("/approve", methods=["POST", "OPTIONS"])
 def approve_task_route():
     # This pre-flight check is needed for browsers
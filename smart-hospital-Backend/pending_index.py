@@ -0,0 +1,186 @@
+# In-memory index of cleaning records waiting for manager review, grouped by hospital.
+# Each gunicorn worker keeps its own copy. Writes made through this worker update it
+# straight away; writes made by other workers arrive as shared-cache invalidations,
+# and the periodic reconcile catches anything that slipped through.
+import sys
+import threading
+import time
+from collections import OrderedDict
+from config import (
+    pending_index_reconcile_seconds,
+    pending_index_max_hospitals,
+    pending_index_max_records,
+)
+
+SORT_OPTIONS = ("oldest", "newest")
+
+
+class PendingEntry:
+    """A single pending cleaning record, stored without the per-row dict overhead."""
+    __slots__ = (
+        "id", "room_id", "cleaner_id", "before_photo_url", "after_photo_url",
+        "cleanliness_status", "ai_remarks", "hospital_id", "created_at",
+    )
+
+    def __init__(self, record):
+        self.id = record.get("id")
+        self.room_id = record.get("room_id")
+        self.cleaner_id = record.get("cleaner_id")
+        self.before_photo_url = record.get("before_photo_url")
+        self.after_photo_url = record.get("after_photo_url")
+        # Only a handful of distinct statuses exist, so share one string object per value
+        status = record.get("cleanliness_status")
+        self.cleanliness_status = sys.intern(status) if isinstance(status, str) else status
+        self.ai_remarks = record.get("ai_remarks")
+        self.hospital_id = record.get("hospital_id")
+        self.created_at = record.get("created_at") or ""
+
+    def to_dict(self):
+        """Returns the record in the same shape as a 'cleaning_records' row."""
+        return {
+            "id": self.id, "room_id": self.room_id, "cleaner_id": self.cleaner_id,
+            "before_photo_url": self.before_photo_url, "after_photo_url": self.after_photo_url,
+            "cleanliness_status": self.cleanliness_status, "ai_remarks": self.ai_remarks,
+            "manager_approval_status": "Pending",
+            "hospital_id": self.hospital_id, "created_at": self.created_at,
+        }
+
+
+class _HospitalBucket:
+    __slots__ = ("entries", "loaded_at")
+
+    def __init__(self, entries):
+        self.entries = entries  # record id -> PendingEntry
+        self.loaded_at = time.monotonic()
+
+
+class PendingIndex:
+    """Per-hospital pending-review cache with bounded size and hit-rate counters."""
+
+    def __init__(self, reconcile_seconds, max_hospitals, max_records):
+        self.reconcile_seconds = reconcile_seconds
+        self.max_hospitals = max_hospitals
+        self.max_records = max_records
+        self._buckets = OrderedDict()  # hospital_id -> _HospitalBucket, least recently used first
+        # Bumped by every write hook and invalidation, loaded or not, so a load that raced
+        # with a write can tell its snapshot is stale. Keyed by str(hospital_id).
+        self._generations = {}
+        self._epoch = 0  # Bumped when every bucket is invalidated at once
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "reconciles": 0, "evictions": 0, "overflows": 0,
+                          "stale_loads": 0}
+
+    # --- Reads ---
+    def get_pending(self, hospital_id, loader, sort="oldest", ai_status=None):
+        """
+        Returns pending records for a hospital, in the same result format as storage.
+        'loader' is called with the hospital_id when the bucket is missing or stale.
+        """
+        with self._lock:
+            bucket = self._buckets.get(hospital_id)
+            fresh = bucket is not None and time.monotonic() - bucket.loaded_at < self.reconcile_seconds
+            if fresh:
+                self._buckets.move_to_end(hospital_id)
+                self._counters["hits"] += 1
+                entries = list(bucket.entries.values())
+            else:
+                self._counters["misses"] += 1
+                if bucket is not None:
+                    self._counters["reconciles"] += 1
+                generation = self._generation(hospital_id)
+
+        if not fresh:
+            result = loader(hospital_id)
+            if not result["success"]:
+                return result
+            entries = [PendingEntry(row) for row in result["data"]]
+            self._store(hospital_id, entries, generation)
+
+        if ai_status:
+            entries = [e for e in entries if e.cleanliness_status == ai_status]
+        # ISO-8601 timestamps from the database sort correctly as plain strings
+        entries.sort(key=lambda e: e.created_at, reverse=(sort == "newest"))
+        return {"success": True, "data": [e.to_dict() for e in entries]}
+
+    def _generation(self, hospital_id):
+        return self._epoch, self._generations.get(str(hospital_id), 0)
+
+    def _bump(self, hospital_id):
+        key = str(hospital_id)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _store(self, hospital_id, entries, generation):
+        with self._lock:
+            if self._generation(hospital_id) != generation:
+                # A save, review or invalidation happened while loading; the snapshot may
+                # predate it, so leave the bucket for the next request to load again
+                self._counters["stale_loads"] += 1
+                return
+            if len(entries) > self.max_records:
+                # Too large to keep in memory; this hospital is always served from the database
+                self._counters["overflows"] += 1
+                self._buckets.pop(hospital_id, None)
+                return
+            self._buckets[hospital_id] = _HospitalBucket({e.id: e for e in entries})
+            self._buckets.move_to_end(hospital_id)
+            while len(self._buckets) > self.max_hospitals:
+                self._buckets.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    # --- Write hooks ---
+    def record_saved(self, record):
+        """Adds a freshly inserted pending record to its hospital's bucket, if that bucket is loaded."""
+        if record.get("manager_approval_status", "Pending") != "Pending":
+            return
+        with self._lock:
+            self._bump(record.get("hospital_id"))
+            bucket = self._buckets.get(record.get("hospital_id"))
+            if bucket is None:
+                return
+            if len(bucket.entries) >= self.max_records:
+                self._counters["overflows"] += 1
+                del self._buckets[record.get("hospital_id")]
+                return
+            bucket.entries[record.get("id")] = PendingEntry(record)
+
+    def record_status_changed(self, record):
+        """Drops a record from the index once a manager has approved or sent it back."""
+        with self._lock:
+            self._bump(record.get("hospital_id"))
+            bucket = self._buckets.get(record.get("hospital_id"))
+            if bucket is None:
+                return
+            if record.get("manager_approval_status") == "Pending":
+                bucket.entries[record.get("id")] = PendingEntry(record)
+            else:
+                bucket.entries.pop(record.get("id"), None)
+
+    def invalidate(self, hospital_id=None):
+        """Forgets one hospital's bucket, or every bucket when no hospital is given."""
+        with self._lock:
+            if hospital_id is None:
+                self._buckets.clear()
+                self._epoch += 1
+                return
+            self._bump(hospital_id)
+            # Invalidations from other workers carry the id as a string
+            for key in [k for k in self._buckets if str(k) == str(hospital_id)]:
+                del self._buckets[key]
+
+    # --- Metrics ---
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["hospitals"] = len(self._buckets)
+            counters["records"] = sum(len(b.entries) for b in self._buckets.values())
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+        return counters
+
+
+# One index per worker process
+pending_index = PendingIndex(
+    reconcile_seconds=pending_index_reconcile_seconds,
+    max_hospitals=pending_index_max_hospitals,
+    max_records=pending_index_max_records,
+)
@@ -0,0 +1,251 @@
+# Opt-in profiling for production workers.
+# - Sampling profiler: while a request is being profiled, a background thread records that
+#   request's call stack every few milliseconds. Stacks are kept in "folded" form
+#   ("outer;inner;leaf count"), which flamegraph.pl and speedscope read directly.
+# - Memory tracking: functions wrapped with @track_memory record a tracemalloc diff per call.
+#   Tracing only runs while at least one tracked call is active. tracemalloc is process-wide,
+#   so a report from a call that overlapped another one also includes that call's allocations;
+#   such reports are marked 'overlapped'.
+# Both are off unless enabled through init_app(); when off, the per-request cost is one flag check.
+import functools
+import itertools
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict, deque
+from flask import g, request
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+SAMPLE_INTERVAL_SECONDS = 0.005
+RETENTION_SECONDS = 900
+MAX_STORED_PROFILES = 50
+MAX_WINDOW_PROFILES = 2000  # Caps the aggregation window when the sample rate is high
+MAX_STACK_DEPTH = 64
+MAX_MEMORY_REPORTS = 100
+MEMORY_TOP_LINES = 10
+
+_settings = {"enabled": False, "sample_rate": 0.0, "memory_tracking": False, "may_force": None}
+
+
+class _Sampler:
+    """One background thread that samples the stacks of every thread currently being profiled."""
+
+    def __init__(self):
+        self._targets = {}  # thread id -> Counter of folded stacks for that request
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wake = threading.Event()
+
+    def start(self, thread_id):
+        stacks = Counter()
+        with self._lock:
+            self._targets[thread_id] = stacks
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return stacks
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = dict(self._targets)
+                if not targets:
+                    self._wake.clear()
+            if not targets:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[_fold(frame)] += 1
+            time.sleep(SAMPLE_INTERVAL_SECONDS)
+
+
+def _fold(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class _ProfileStore:
+    """Keeps recent per-request profiles for a bounded time window and count."""
+
+    def __init__(self):
+        self._window = deque(maxlen=MAX_WINDOW_PROFILES)  # (finished_at, Counter of stacks)
+        self._profiles = OrderedDict()  # profile id -> summary dict, oldest first
+        self._lock = threading.Lock()
+
+    def add(self, profile_id, endpoint, duration, stacks):
+        now = time.time()
+        with self._lock:
+            self._window.append((now, stacks))
+            while self._window and self._window[0][0] < now - RETENTION_SECONDS:
+                self._window.popleft()
+            self._profiles[profile_id] = {
+                "id": profile_id, "endpoint": endpoint, "finished_at": now,
+                "duration_ms": round(duration * 1000, 2), "samples": sum(stacks.values()),
+                "stacks": dict(stacks),
+            }
+            while len(self._profiles) > MAX_STORED_PROFILES:
+                self._profiles.popitem(last=False)
+
+    def aggregate(self, seconds):
+        since = time.time() - seconds
+        total = Counter()
+        requests = 0
+        with self._lock:
+            for finished_at, stacks in self._window:
+                if finished_at >= since:
+                    total.update(stacks)
+                    requests += 1
+        return {"window_seconds": seconds, "requests": requests,
+                "samples": sum(total.values()), "stacks": dict(total)}
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+_sampler = _Sampler()
+_store = _ProfileStore()
+_profile_ids = itertools.count(1)
+
+
+# --- Request Hooks ---
+def _should_profile():
+    if not _settings["enabled"]:
+        return False
+    if request.headers.get(PROFILE_HEADER) == "1" and _settings["may_force"] is not None and _settings["may_force"]():
+        return True
+    return _settings["sample_rate"] > 0 and random.random() < _settings["sample_rate"]
+
+
+def _start_request_profile():
+    if not _should_profile():
+        return
+    g.profile_started = time.perf_counter()
+    _sampler.start(threading.get_ident())
+
+
+def _finish_request_profile(response):
+    started = g.pop("profile_started", None)
+    if started is None:
+        return response
+    stacks = _sampler.stop(threading.get_ident())
+    profile_id = f"{next(_profile_ids)}-{int(time.time())}"
+    _store.add(profile_id, request.endpoint, time.perf_counter() - started, stacks)
+    response.headers[PROFILE_ID_HEADER] = profile_id
+    return response
+
+
+def init_app(app, enabled=False, sample_rate=0.0, memory_tracking=False, may_force=None):
+    """
+    Registers the profiling hooks. Nothing is sampled unless 'enabled' is true.
+    'may_force' is called for requests sent with the X-Profile header and decides whether the
+    caller may force a profile; without it the header is ignored and only sampling applies.
+    """
+    _settings["enabled"] = enabled
+    _settings["sample_rate"] = sample_rate
+    _settings["memory_tracking"] = memory_tracking
+    _settings["may_force"] = may_force
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+    return app
+
+
+def get_window(seconds):
+    """Folded stacks from every profiled request that finished in the last 'seconds'."""
+    return _store.aggregate(min(seconds, RETENTION_SECONDS))
+
+
+def get_profile(profile_id):
+    return _store.get(profile_id)
+
+
+def to_folded_text(stacks):
+    """Renders stacks in the plain-text folded format used by flame graph tools."""
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(stacks.items())) + "\n"
+
+
+# --- Memory Tracking ---
+_memory_reports = deque(maxlen=MAX_MEMORY_REPORTS)
+_memory_lock = threading.Lock()
+_tracing = {"active": 0, "calls": 0, "started_here": False}  # Guarded by _memory_lock
+
+
+def _begin_tracking():
+    """Starts tracing for the first active tracked call; returns the call count seen at entry."""
+    with _memory_lock:
+        if _tracing["active"] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing["started_here"] = True
+        elif _tracing["active"] == 0:
+            tracemalloc.reset_peak()  # Tracing was started elsewhere; measure the peak from here
+        _tracing["active"] += 1
+        _tracing["calls"] += 1
+        return _tracing["calls"], _tracing["active"] > 1
+
+
+def _end_tracking():
+    """Stops tracing once the last tracked call finishes, unless something else had started it."""
+    with _memory_lock:
+        _tracing["active"] -= 1
+        if _tracing["active"] == 0 and _tracing["started_here"]:
+            tracemalloc.stop()
+            _tracing["started_here"] = False
+        return _tracing["calls"]
+
+
+def track_memory(label):
+    """Decorator that records the allocations made during each call, when memory tracking is on."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _settings["memory_tracking"]:
+                return func(*args, **kwargs)
+            calls_at_start, overlapped = _begin_tracking()
+            before = tracemalloc.take_snapshot()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                after = tracemalloc.take_snapshot()
+                # Peak since tracing started; only meaningful for this call when nothing overlapped it
+                _, peak = tracemalloc.get_traced_memory()
+                overlapped = _end_tracking() != calls_at_start or overlapped
+                _record_memory(label, before, after, peak, overlapped)
+        return wrapper
+    return decorator
+
+
+def _record_memory(label, before, after, peak, overlapped):
+    diff = after.compare_to(before, "lineno")
+    top = [{
+        "location": f"{stat.traceback[0].filename.rsplit('/', 1)[-1]}:{stat.traceback[0].lineno}",
+        "size_diff_kb": round(stat.size_diff / 1024, 1),
+        "count_diff": stat.count_diff,
+    } for stat in diff[:MEMORY_TOP_LINES]]
+    with _memory_lock:
+        _memory_reports.append({
+            "label": label, "recorded_at": time.time(),
+            "thread": threading.current_thread().name, "overlapped": overlapped,
+            "net_kb": round(sum(stat.size_diff for stat in diff) / 1024, 1),
+            "peak_kb": round(peak / 1024, 1), "top": top,
+        })
+
+
+def get_memory_reports(label=None):
+    with _memory_lock:
+        reports = list(_memory_reports)
+    return [r for r in reports if label is None or r["label"] == label]
@@ -0,0 +1,74 @@
+# Replays recorded Gemini responses through the verdict parser, offline.
+# The corpus is the JSONL file written when AI_RESPONSE_LOG_PATH is set (one {"text": ...} per line),
+# or a directory of .txt files with one raw response each.
+# Entries that were re-asked live carry the re-ask answer ("reask_text"); it is fed back to the
+# parser in place of a model call, so outcomes here line up with the live /ai/stats numbers.
+# Run with: python replay_verdicts.py <corpus.jsonl | directory>
+import json
+import os
+import sys
+import time
+import ai_verdict
+
+
+def load_corpus(path):
+    if os.path.isdir(path):
+        entries = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".txt"):
+                with open(os.path.join(path, name), encoding="utf-8") as f:
+                    entries.append({"text": f.read()})
+        return entries
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _recorded_reask(entry):
+    """A stand-in for the model that returns the recorded re-ask answer, or None if there was no re-ask."""
+    if not entry.get("reasked"):
+        return None
+
+    def reask(previous_text):
+        if entry.get("reask_text") is None:
+            raise RuntimeError("The live re-ask failed.")
+        return entry["reask_text"]
+    return reask
+
+
+def replay(entries):
+    outcomes = {"parsed": 0, "repaired": 0, "fallback": 0}
+    timings = []
+    mismatches = 0
+    for entry in entries:
+        start = time.perf_counter()
+        # Entries without a recorded re-ask get none, so anything the local parsers cannot read is a fallback
+        _, _, outcome = ai_verdict.resolve_verdict(entry["text"], reask=_recorded_reask(entry))
+        timings.append(time.perf_counter() - start)
+        outcomes[outcome] += 1
+        if entry.get("outcome") and entry["outcome"] != outcome:
+            mismatches += 1
+    return outcomes, timings, mismatches
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python replay_verdicts.py <corpus.jsonl | directory>")
+        sys.exit(1)
+
+    entries = load_corpus(sys.argv[1])
+    if not entries:
+        print("Corpus is empty.")
+        sys.exit(1)
+
+    outcomes, timings, mismatches = replay(entries)
+    timings.sort()
+    total = len(entries)
+    print(f"\n--- Replayed {total} responses ---")
+    for outcome, count in outcomes.items():
+        print(f"{outcome:<9}: {count:>6} ({count / total:.1%})")
+    print(f"success  : {(outcomes['parsed'] + outcomes['repaired']) / total:.1%}")
+    print(f"reasked  : {sum(1 for e in entries if e.get('reasked')):>6}")
+    print(f"differs from live outcome: {mismatches}")
+    print(f"latency  : p50 {timings[total // 2] * 1e6:.1f} us, "
+          f"p99 {timings[min(total - 1, int(total * 0.99))] * 1e6:.1f} us, "
+          f"max {timings[-1] * 1e6:.1f} us")
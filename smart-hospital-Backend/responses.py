@@ -0,0 +1,112 @@
+# Helpers for making API responses smaller and cheaper to produce:
+# a faster JSON provider, negotiated gzip/brotli compression and optional field selection.
+import gzip
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Fall back to Flask's standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+# PDFs and images are already compressed, so only text-like bodies are worth the CPU
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/html", "text/plain", "text/css", "application/javascript"}
+DEFAULT_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, producing compact output without extra whitespace."""
+
+    def dumps(self, obj, **kwargs):
+        # orjson output is always compact; only debug pretty-printing needs the standard encoder
+        if orjson is None or kwargs.get("indent") is not None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS, default=self.default).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def choose_encoding(accept_encoding):
+    """
+    Picks the encoding we support with the highest q-value in an Accept-Encoding header, or None.
+    '*' covers any encoding not listed by name; on a tie brotli wins because it compresses better.
+    """
+    offered = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name.lower()] = quality
+    wildcard = offered.get("*", 0.0)
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = max(supported, key=lambda name: offered.get(name, wildcard))  # max() keeps the first on a tie
+    return best if offered.get(best, wildcard) > 0 else None
+
+
+def compress_body(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, accept_encoding, min_size=DEFAULT_MIN_SIZE):
+    """Compresses a finished response in place when the client accepts it and it is big enough."""
+    response.vary.add("Accept-Encoding")
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    response.set_data(compress_body(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def select_fields(result, fields_param):
+    """
+    Trims each row of a list result down to the comma-separated fields the client asked for.
+    Results without a 'data' list, or requests without a 'fields' parameter, are returned unchanged.
+    """
+    if not fields_param or not isinstance(result.get("data"), list):
+        return result
+    fields = [f.strip() for f in fields_param.split(",") if f.strip()]
+    if not fields:
+        return result
+    trimmed = [{k: row[k] for k in fields if k in row} for row in result["data"]]
+    return {**result, "data": trimmed}
+
+
+def init_app(app, min_size=DEFAULT_MIN_SIZE):
+    """Installs the JSON provider and the compression hook on a Flask app."""
+    app.json_provider_class = OrjsonProvider
+    app.json = OrjsonProvider(app)
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, request.headers.get("Accept-Encoding"), min_size)
+
+    return app
@@ -0,0 +1,391 @@
+# Cache shared between the gunicorn workers, with cross-worker invalidation.
+# Three backends are available:
+#   - "local":  a plain in-process dict (development, single worker)
+#   - "sqlite": a SQLite file every worker on the same host opens (no extra services)
+#   - "redis":  any server that speaks the Redis protocol (multi-host deployments)
+# Invalidations are published to the other workers and delivered when they call poll(),
+# which main.py does at the start of every request.
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from config import cache_backend, cache_sqlite_path, redis_url
+
+try:
+    import redis
+except ImportError:  # Only needed when CACHE_BACKEND=redis
+    redis = None
+
+INVALIDATION_CHANNEL = "cache-invalidations"
+LOCK_TTL_SECONDS = 10
+LOCK_POLL_SECONDS = 0.05
+LOCK_POLL_MAX_SECONDS = 1.0
+
+
+def _encode(value):
+    return json.dumps(value, default=str)
+
+
+def _decode(raw):
+    return None if raw is None else json.loads(raw)
+
+
+# --- Backends ---
+class LocalBackend:
+    """In-process dictionary. Nothing is shared, so there is nobody to notify on invalidation."""
+
+    def __init__(self):
+        self._values = {}  # key -> (encoded value, expires_at or None)
+        self._locks = {}
+        self._mutex = threading.Lock()
+
+    def get(self, key):
+        with self._mutex:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            raw, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._values[key]
+                return None
+            return raw
+
+    def set(self, key, raw, ttl):
+        with self._mutex:
+            self._values[key] = (raw, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._mutex:
+            self._values.pop(key, None)
+
+    def acquire_lock(self, key, ttl):
+        with self._mutex:
+            expires_at = self._locks.get(key)
+            if expires_at is not None and expires_at > time.time():
+                return False
+            self._locks[key] = time.time() + ttl
+            return True
+
+    def release_lock(self, key):
+        with self._mutex:
+            self._locks.pop(key, None)
+
+    def publish(self, key, origin):
+        pass
+
+    def poll_invalidations(self):
+        return []
+
+
+class SQLiteBackend:
+    """A SQLite file shared by every worker on one host. Invalidations are rows in a log table."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._last_seen = None
+        self._last_prune = 0.0
+
+    def _conn(self):
+        # Connections must not cross a fork or be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, expires_at REAL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS invalidations "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, origin TEXT, created_at REAL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if self._last_seen is None:
+                # Only deliver invalidations published after this worker started
+                self._last_seen = conn.execute("SELECT COALESCE(MAX(id), 0) FROM invalidations").fetchone()[0]
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, raw, ttl):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, raw, time.time() + ttl if ttl else None),
+        )
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def acquire_lock(self, key, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM locks WHERE key = ? AND expires_at <= ?", (key, now))
+        cursor = conn.execute("INSERT OR IGNORE INTO locks (key, expires_at) VALUES (?, ?)", (key, now + ttl))
+        return cursor.rowcount == 1
+
+    def release_lock(self, key):
+        self._conn().execute("DELETE FROM locks WHERE key = ?", (key,))
+
+    def publish(self, key, origin):
+        self._conn().execute(
+            "INSERT INTO invalidations (key, origin, created_at) VALUES (?, ?, ?)",
+            (key, origin, time.time()),
+        )
+
+    def poll_invalidations(self):
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT id, key, origin FROM invalidations WHERE id > ? ORDER BY id", (self._last_seen,)
+        ).fetchall()
+        if rows:
+            self._last_seen = rows[-1][0]
+        now = time.time()
+        if now - self._last_prune > 60:
+            # Every worker polls far more often than this, so old entries are safe to drop
+            conn.execute("DELETE FROM invalidations WHERE created_at < ?", (now - 300,))
+            conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            self._last_prune = now
+        return [(key, origin) for _, key, origin in rows]
+
+
+class RedisBackend:
+    """Redis-protocol server. Values live under 'cache:', locks under 'lock:', invalidations use pub/sub."""
+
+    def __init__(self, url=None, client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package.")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self._pubsub = None
+        self._pubsub_pid = None
+        self._pubsub_lock = threading.Lock()  # PubSub objects are not thread-safe; gthread workers poll concurrently
+
+    def get(self, key):
+        raw = self.client.get("cache:" + key)
+        return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+    def set(self, key, raw, ttl):
+        self.client.set("cache:" + key, raw, ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete("cache:" + key)
+
+    def acquire_lock(self, key, ttl):
+        return bool(self.client.set("lock:" + key, str(os.getpid()), nx=True, ex=ttl))
+
+    def release_lock(self, key):
+        self.client.delete("lock:" + key)
+
+    def publish(self, key, origin):
+        self.client.publish(INVALIDATION_CHANNEL, json.dumps({"key": key, "origin": origin}))
+
+    def poll_invalidations(self):
+        with self._pubsub_lock:
+            if self._pubsub is None or self._pubsub_pid != os.getpid():
+                self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                self._pubsub.subscribe(INVALIDATION_CHANNEL)
+                self._pubsub_pid = os.getpid()
+            received = []
+            while True:
+                message = self._pubsub.get_message(timeout=0)
+                if message is None:
+                    break
+                if message.get("type") != "message":
+                    continue
+                data = json.loads(message["data"])
+                received.append((data["key"], data["origin"]))
+            return received
+
+
+# --- Cache Front-End ---
+class SharedCache:
+    """
+    Backend-agnostic cache with single-flight loading, invalidation callbacks
+    and hit/miss/latency counters.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._callbacks = []  # (key prefix, callback)
+        self._flights = {}  # key -> threading.Event for loads in progress in this worker
+        self._mutex = threading.Lock()
+        self._counters = {
+            "hits": 0, "misses": 0, "loads": 0, "waits": 0, "errors": 0,
+            "invalidations_sent": 0, "invalidations_received": 0,
+        }
+        self._get_seconds = 0.0
+        self._gets = 0
+
+    @property
+    def origin(self):
+        # Worker identity; computed on use because gunicorn forks after import
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _count(self, name, amount=1):
+        with self._mutex:
+            self._counters[name] += amount
+
+    def get(self, key):
+        start = time.perf_counter()
+        try:
+            value = _decode(self.backend.get(key))
+        except Exception as e:
+            print(f"Shared cache read failed for '{key}': {e}")
+            self._count("errors")
+            value = None
+        with self._mutex:
+            self._gets += 1
+            self._get_seconds += time.perf_counter() - start
+            self._counters["hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.backend.set(key, _encode(value), ttl)
+        except Exception as e:
+            print(f"Shared cache write failed for '{key}': {e}")
+            self._count("errors")
+
+    def invalidate(self, key):
+        """Removes a key and tells the other workers about it."""
+        try:
+            self.backend.delete(key)
+            self.backend.publish(key, self.origin)
+            self._count("invalidations_sent")
+        except Exception as e:
+            print(f"Shared cache invalidation failed for '{key}': {e}")
+            self._count("errors")
+
+    def get_or_load(self, key, loader, ttl=None, should_cache=None, load_timeout=None):
+        """
+        Returns the cached value for 'key', calling 'loader' on a miss.
+        Only one caller per key runs the loader at a time, within this worker and
+        (through a backend lock) across workers; the rest wait for its result.
+        'should_cache' can reject a loaded value, e.g. a failed database result.
+        'load_timeout' is how long a load may take: the backend lock is held that long
+        and waiters wait that long before loading themselves. Slow loaders must raise it.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        load_timeout = load_timeout or LOCK_TTL_SECONDS
+
+        with self._mutex:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Event()
+
+        if not leader:
+            self._count("waits")
+            flight.wait(load_timeout)
+            value = self.get(key)
+            return value if value is not None else loader()
+
+        try:
+            locked = self._acquire_lock(key, load_timeout)
+            if not locked:
+                # Another worker is loading; wait until it stores the value or gives up the lock
+                self._count("waits")
+                deadline = time.monotonic() + load_timeout
+                interval = LOCK_POLL_SECONDS
+                while time.monotonic() < deadline:
+                    time.sleep(interval)
+                    interval = min(interval * 2, LOCK_POLL_MAX_SECONDS)
+                    value = self.get(key)
+                    if value is not None:
+                        return value
+                    locked = self._acquire_lock(key, load_timeout)
+                    if locked:
+                        # The other load finished without caching a value, or its lock expired
+                        value = self.get(key)
+                        if value is not None:
+                            self._release_lock(key)
+                            return value
+                        break
+            try:
+                self._count("loads")
+                value = loader()
+                if value is not None and (should_cache is None or should_cache(value)):
+                    self.set(key, value, ttl)
+                return value
+            finally:
+                if locked:
+                    self._release_lock(key)
+        finally:
+            with self._mutex:
+                self._flights.pop(key, None)
+            flight.set()
+
+    def try_lock(self, key, ttl=LOCK_TTL_SECONDS):
+        """Takes a cross-worker lock on 'key' without waiting; returns False if someone else holds it."""
+        return self._acquire_lock(key, ttl)
+
+    def unlock(self, key):
+        self._release_lock(key)
+
+    def _acquire_lock(self, key, ttl=LOCK_TTL_SECONDS):
+        try:
+            return self.backend.acquire_lock(key, ttl)
+        except Exception as e:
+            print(f"Shared cache lock failed for '{key}': {e}")
+            self._count("errors")
+            return True  # Proceed as if we held it; the loader still runs once in this worker
+
+    def _release_lock(self, key):
+        try:
+            self.backend.release_lock(key)
+        except Exception:
+            self._count("errors")
+
+    def on_invalidate(self, prefix, callback):
+        """Registers callback(key) for invalidations published by other workers."""
+        self._callbacks.append((prefix, callback))
+
+    def poll(self):
+        """Delivers pending invalidations from other workers to the registered callbacks."""
+        try:
+            received = self.backend.poll_invalidations()
+        except Exception as e:
+            print(f"Shared cache poll failed: {e}")
+            self._count("errors")
+            return
+        origin = self.origin
+        for key, sender in received:
+            if sender == origin:
+                continue
+            self._count("invalidations_received")
+            for prefix, callback in self._callbacks:
+                if key.startswith(prefix):
+                    callback(key)
+
+    def stats(self):
+        with self._mutex:
+            counters = dict(self._counters)
+            gets, get_seconds = self._gets, self._get_seconds
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+        counters["avg_get_ms"] = round(get_seconds / gets * 1000, 3) if gets else 0.0
+        counters["backend"] = type(self.backend).__name__
+        return counters
+
+
+def create_backend(kind, sqlite_path=None, redis_url=None):
+    if kind == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    if kind == "redis":
+        return RedisBackend(url=redis_url)
+    return LocalBackend()
+
+
+# One cache front-end per worker process, all pointing at the same backend
+shared_cache = SharedCache(create_backend(cache_backend, cache_sqlite_path, redis_url))
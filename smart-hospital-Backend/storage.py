@@ -1,14 +1,29 @@
 from config import supabase
+from pending_index import pending_index
+from shared_cache import shared_cache
+from config import hospitals_cache_ttl
 from datetime import datetime, timedelta, timezone
 
-def get_hospitals():
-    """Fetches a list of all hospitals."""
+def _fetch_hospitals():
     try:
         response = supabase.table("hospitals").select("id, name").execute()
         return {"success": True, "data": response.data}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def get_hospitals():
+    """Fetches a list of all hospitals. The list rarely changes, so it is cached for all workers."""
+    return shared_cache.get_or_load(
+        "hospitals", _fetch_hospitals, ttl=hospitals_cache_ttl,
+        should_cache=lambda result: result["success"]
+    )
+
+# Other workers drop their copy of a hospital's pending list when this worker changes it
+def _publish_pending_change(record):
+    shared_cache.invalidate(f"pending:{record.get('hospital_id')}")
+
+shared_cache.on_invalidate("pending:", lambda key: pending_index.invalidate(key.split(":", 1)[1]))
+
 # --- User and Auth Functions ---
 # Find the create_user function and add hospital_id
 def create_user(email, password_hash, role, full_name, hospital_id=None): # Add hospital_id
@@ -44,9 +59,13 @@ def create_task_assignment(room_id, cleaner_id, assigned_by_id, assignment_date,
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def get_tasks_for_cleaner(cleaner_id):
+def get_tasks_for_cleaner(cleaner_id, changed_since=None):
+    """Gets a cleaner's tasks, optionally only those created at or after 'changed_since' (an ISO timestamp)."""
     try:
-        response = supabase.table("task_assignments").select("*").eq("cleaner_id", cleaner_id).execute()
+        query = supabase.table("task_assignments").select("*").eq("cleaner_id", cleaner_id)
+        if changed_since:
+            query = query.gte("created_at", changed_since)
+        response = query.order("created_at").execute()
         return {"success": True, "data": response.data}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -63,6 +82,8 @@ def save_cleaning_record(room_id, cleaner_id, before_photo_url, after_photo_url,
             "hospital_id": hospital_id # Add hospital_id to the record
         }
         response = supabase.table('cleaning_records').insert(record).execute()
+        pending_index.record_saved(response.data[0])
+        _publish_pending_change(response.data[0])
         return {"success": True, "data": response.data[0]}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -99,7 +120,9 @@ def update_record_status(record_id, new_status, hospital_id):
         if not response.data:
              return {"success": False, "message": "Record not found in your hospital, or permission denied."}
         # --- END OF FIX ---
-             
+
+        pending_index.record_status_changed(response.data[0])
+        _publish_pending_change(response.data[0])
         return {"success": True, "data": response.data[0]}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -126,6 +149,55 @@ def get_weekly_approved_records(hospital_id=None):
         print(f"Database error fetching weekly report data: {e}")
         return {"success": False, "data": [], "error": str(e)}
     
+ANALYTICS_COLUMNS = "id, room_id, cleaner_id, cleanliness_status, manager_approval_status, created_at, hospital_id"
+ANALYTICS_PAGE_SIZE = 1000  # Supabase returns at most 1000 rows per request
+
+def get_records_in_window(start, end, hospital_id=None, max_rows=None):
+    """
+    Fetches cleaning records created in [start, end), newest first, a page at a time, with only
+    the analytics columns. Each page continues from the oldest timestamp seen so far (keyset
+    pagination), so it is an index range scan rather than an OFFSET that slows down with depth.
+    At most 'max_rows' are returned; when the window holds more, 'truncated' is set and
+    'covered_start' is the creation time of the oldest record included.
+    """
+    try:
+        rows = []
+        boundary, boundary_ids = None, set()  # Oldest timestamp fetched, and the ids already taken at it
+        while max_rows is None or len(rows) <= max_rows:
+            query = supabase.table('cleaning_records') \
+                .select(ANALYTICS_COLUMNS) \
+                .gte('created_at', start.isoformat()) \
+                .lt('created_at', end.isoformat()) \
+                .order('created_at', desc=True) \
+                .limit(ANALYTICS_PAGE_SIZE)
+            if hospital_id:
+                query = query.eq('hospital_id', hospital_id)
+            if boundary is not None:
+                # Records sharing the boundary timestamp may straddle two pages; skip the ones we have
+                query = query.lte('created_at', boundary)
+
+            page = query.execute().data
+            new_rows = [r for r in page if not (r['created_at'] == boundary and r['id'] in boundary_ids)]
+            if not new_rows:
+                break
+            rows.extend(new_rows)
+
+            oldest = page[-1]['created_at']
+            taken = {r['id'] for r in page if r['created_at'] == oldest}
+            boundary_ids = taken | boundary_ids if oldest == boundary else taken
+            boundary = oldest
+            if len(page) < ANALYTICS_PAGE_SIZE:
+                break
+
+        # One row past the cap tells a full window apart from one that was cut short
+        truncated = max_rows is not None and len(rows) > max_rows
+        if truncated:
+            rows = rows[:max_rows]
+        covered_start = rows[-1]['created_at'] if truncated else start.isoformat()
+        return {"success": True, "data": rows, "truncated": truncated, "covered_start": covered_start}
+    except Exception as e:
+        return {"success": False, "data": [], "error": str(e)}
+
 # --- Manager Task Functions ---
 def create_manager_task(assigned_by_id, assigned_to_id, description, due_date):
     """Saves a new high-level task for a manager."""
@@ -0,0 +1,75 @@
+# Support for the offline-first cleaner client:
+# - opaque cursors for delta sync of task lists
+# - Idempotency-Key handling so a submission replayed from the client's queue is only stored once
+import base64
+import json
+import re
+from shared_cache import shared_cache
+from config import idempotency_ttl_seconds
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# How long one attempt may hold a key; it must outlast the slowest handler (see GEMINI_TIMEOUT_SECONDS)
+IDEMPOTENCY_LOCK_SECONDS = 120
+_IDEMPOTENCY_KEY = re.compile(r"^[A-Za-z0-9_-]{8,128}$")
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor this server did not issue."""
+
+
+# --- Delta Sync Cursors ---
+def encode_cursor(changed_at):
+    if not changed_at:
+        return None
+    raw = json.dumps({"t": changed_at}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        changed_at = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["t"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("Invalid sync cursor.") from e
+    if not isinstance(changed_at, str):
+        raise InvalidCursor("Invalid sync cursor.")
+    return changed_at
+
+
+def next_cursor(rows, previous_cursor=None, column="created_at"):
+    """The cursor to hand back after sending 'rows': the newest change seen so far."""
+    newest = max((row.get(column) for row in rows if row.get(column)), default=None)
+    return encode_cursor(newest) if newest else previous_cursor
+
+
+# --- Idempotent Submissions ---
+def valid_idempotency_key(key):
+    return bool(key and _IDEMPOTENCY_KEY.match(key))
+
+
+def run_idempotent(scope, key, handler):
+    """
+    Runs handler() -> (body, status) at most once per (scope, key).
+    A replay gets the stored body back with 'replayed': True. A replay that arrives while
+    the first attempt is still running gets a 409 so the client retries later.
+    Only successful (2xx) results are stored; after an error the client's retry runs the handler again.
+    """
+    cache_key = f"idem:{scope}:{key}"
+    stored = shared_cache.get(cache_key)
+    if stored is not None:
+        return {**stored["body"], "replayed": True}, stored["status"]
+
+    if not shared_cache.try_lock(cache_key, ttl=IDEMPOTENCY_LOCK_SECONDS):
+        return {"success": False, "message": "This submission is already being processed."}, 409
+    try:
+        # Re-check now that we hold the lock, in case another worker just finished
+        stored = shared_cache.get(cache_key)
+        if stored is not None:
+            return {**stored["body"], "replayed": True}, stored["status"]
+
+        body, status = handler()
+        if 200 <= status < 300:
+            shared_cache.set(cache_key, {"body": body, "status": status}, ttl=idempotency_ttl_seconds)
+        return body, status
+    finally:
+        shared_cache.unlock(cache_key)
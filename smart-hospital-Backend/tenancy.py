@@ -0,0 +1,94 @@
+# Per-hospital admission control for expensive work (Gemini calls, PDF rendering).
+# Each limiter gives every hospital a small number of concurrent slots and a short waiting
+# line. Work beyond that is refused straight away with TenantBusy instead of tying up the
+# worker's threads, so one busy hospital cannot starve the others.
+# Limits are per worker process, so a container with N workers gives each hospital N times
+# the slots. In the scaled deployment each backend container runs a single worker and the
+# router (see smart-hospital-Router/) sends a hospital's traffic to one container, so the
+# limits apply per hospital there.
+import threading
+import time
+from contextlib import contextmanager
+
+ALL_HOSPITALS = "__all__"  # Tenant key for work that spans every hospital, e.g. the commissioner's report
+
+
+class TenantBusy(Exception):
+    """Raised when a hospital has used up its slots and its waiting line is full or timed out."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _TenantState:
+    __slots__ = ("active", "waiting", "admitted", "rejected", "timed_out")
+
+    def __init__(self):
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+
+class TenantLimiter:
+    """Bounded per-tenant concurrency with a bounded wait queue, plus an overall cap."""
+
+    def __init__(self, name, per_tenant, queue_per_tenant, max_total, wait_seconds):
+        self.name = name
+        self.per_tenant = per_tenant
+        self.queue_per_tenant = queue_per_tenant
+        self.max_total = max_total
+        self.wait_seconds = wait_seconds
+        self._states = {}
+        self._total_active = 0
+        self._cond = threading.Condition()
+
+    def _can_run(self, state):
+        return state.active < self.per_tenant and self._total_active < self.max_total
+
+    @contextmanager
+    def slot(self, tenant):
+        """Holds one of the tenant's slots for the duration of the block."""
+        tenant = str(tenant or ALL_HOSPITALS)
+        with self._cond:
+            state = self._states.setdefault(tenant, _TenantState())
+            if not self._can_run(state):
+                if state.waiting >= self.queue_per_tenant:
+                    state.rejected += 1
+                    raise TenantBusy(f"Too many {self.name} requests for this hospital.", retry_after=self.wait_seconds)
+                state.waiting += 1
+                deadline = time.monotonic() + self.wait_seconds
+                try:
+                    while not self._can_run(state):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            state.timed_out += 1
+                            raise TenantBusy(f"Timed out waiting for a {self.name} slot.", retry_after=self.wait_seconds)
+                        self._cond.wait(remaining)
+                finally:
+                    state.waiting -= 1
+            state.active += 1
+            state.admitted += 1
+            self._total_active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                state.active -= 1
+                self._total_active -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limiter": self.name, "per_tenant": self.per_tenant, "queue_per_tenant": self.queue_per_tenant,
+                "max_total": self.max_total, "active": self._total_active,
+                "tenants": {
+                    tenant: {"active": s.active, "waiting": s.waiting, "admitted": s.admitted,
+                             "rejected": s.rejected, "timed_out": s.timed_out}
+                    for tenant, s in self._states.items()
+                },
+            }
+
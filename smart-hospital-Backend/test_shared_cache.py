@@ -0,0 +1,94 @@
+# Tests for the Redis-protocol cache backend against fakeredis, an in-memory Redis server.
+# Two cache front-ends on one fake server stand in for two gunicorn workers.
+# Run with: pip install -r requirements-dev.txt && python -m pytest test_shared_cache.py
+import time
+import fakeredis
+import pytest
+from shared_cache import RedisBackend, SharedCache
+
+
+class _Worker(SharedCache):
+    """A SharedCache with a fixed origin, so two of them in one process act like separate workers."""
+
+    def __init__(self, backend, name):
+        super().__init__(backend)
+        self._name = name
+
+    @property
+    def origin(self):
+        return self._name
+
+
+@pytest.fixture
+def workers():
+    server = fakeredis.FakeServer()
+    first = _Worker(RedisBackend(client=fakeredis.FakeRedis(server=server)), "worker-a")
+    second = _Worker(RedisBackend(client=fakeredis.FakeRedis(server=server)), "worker-b")
+    return first, second
+
+
+def test_values_are_shared_between_workers(workers):
+    first, second = workers
+    first.set("hospitals", [{"id": 1, "name": "General"}])
+    assert second.get("hospitals") == [{"id": 1, "name": "General"}]
+    assert second.get("missing") is None
+
+
+def test_values_expire_after_ttl(workers):
+    first, second = workers
+    first.set("short", {"value": 1}, ttl=1)
+    first.set("forever", {"value": 2})
+    assert second.get("short") == {"value": 1}
+    assert first.backend.client.ttl("cache:forever") == -1
+    time.sleep(1.1)
+    assert second.get("short") is None
+    assert second.get("forever") == {"value": 2}
+
+
+def test_lock_is_held_until_released(workers):
+    first, second = workers
+    assert first.try_lock("report", ttl=5)
+    assert not second.try_lock("report", ttl=5)
+    assert not first.try_lock("report", ttl=5)
+    first.unlock("report")
+    assert second.try_lock("report", ttl=5)
+
+
+def test_lock_expires_after_ttl(workers):
+    first, second = workers
+    assert first.try_lock("report", ttl=1)
+    time.sleep(1.1)
+    assert second.try_lock("report", ttl=1)
+
+
+def test_get_or_load_uses_value_loaded_by_other_worker(workers):
+    first, second = workers
+    calls = []
+    assert first.get_or_load("rooms", lambda: calls.append("a") or ["101"], ttl=30) == ["101"]
+    assert second.get_or_load("rooms", lambda: calls.append("b") or ["999"], ttl=30) == ["101"]
+    assert calls == ["a"]
+
+
+def test_invalidation_reaches_other_worker(workers):
+    first, second = workers
+    received = []
+    second.on_invalidate("hospitals", received.append)
+    second.poll()  # Subscribes, as main.py does on a worker's first request
+
+    first.set("hospitals", ["General"])
+    first.invalidate("hospitals")
+
+    assert second.get("hospitals") is None
+    second.poll()
+    assert received == ["hospitals"]
+    assert second.stats()["invalidations_received"] == 1
+
+
+def test_worker_ignores_its_own_invalidations(workers):
+    first, _ = workers
+    received = []
+    first.on_invalidate("", received.append)
+    first.poll()
+    first.invalidate("hospitals")
+    first.poll()
+    assert received == []
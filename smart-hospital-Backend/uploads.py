@@ -0,0 +1,189 @@
+# Resumable photo uploads.
+# A client starts an upload with its metadata, sends the file in chunks at explicit offsets
+# (each with an optional SHA-256 checksum), and finalizes it once every byte has arrived.
+# Chunks are written straight to disk under UPLOAD_DIR, so any worker on the host can
+# accept the next chunk, and an interrupted upload resumes from the last stored offset.
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from config import upload_dir, max_photo_bytes, upload_chunk_bytes, upload_ttl_seconds
+
+STREAM_BLOCK_BYTES = 64 * 1024
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _paths(upload_id):
+    if not _UPLOAD_ID.match(upload_id or ""):
+        return None
+    base = os.path.join(upload_dir, upload_id)
+    return base + ".json", base + ".part"
+
+
+def _read_meta(meta_path):
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _public(meta):
+    return {
+        "upload_id": meta["upload_id"], "offset": meta["offset"], "size": meta["size"],
+        "chunk_size": upload_chunk_bytes, "complete": meta["offset"] == meta["size"],
+    }
+
+
+def create_upload(room_id, cleaner_id, hospital_id, filename, size, sha256=None):
+    """Registers a new upload after its metadata has been validated."""
+    if not isinstance(size, int) or size <= 0:
+        return {"success": False, "message": "File size must be a positive number of bytes."}
+    if filename is not None and not isinstance(filename, str):
+        return {"success": False, "message": "filename must be a string."}
+    if size > max_photo_bytes:
+        return {"success": False, "message": f"Photo is larger than the {max_photo_bytes // (1024 * 1024)}MB limit."}
+    if sha256 is not None and not re.match(r"^[0-9a-fA-F]{64}$", str(sha256)):
+        return {"success": False, "message": "sha256 must be a 64-character hex digest."}
+
+    os.makedirs(upload_dir, exist_ok=True)
+    _expire_old_uploads()
+
+    upload_id = uuid.uuid4().hex
+    meta_path, part_path = _paths(upload_id)
+    meta = {
+        "upload_id": upload_id, "room_id": room_id, "cleaner_id": cleaner_id,
+        "hospital_id": hospital_id, "filename": os.path.basename(filename or "photo"),
+        "size": size, "sha256": sha256.lower() if sha256 else None,
+        "offset": 0, "created_at": time.time(),
+    }
+    open(part_path, "wb").close()
+    _write_meta(meta_path, meta)
+    return {"success": True, "data": _public(meta)}
+
+
+def get_upload(upload_id, include_meta=False):
+    """Reports an upload's progress; 'include_meta' also returns the stored room, cleaner and hospital."""
+    paths = _paths(upload_id)
+    if paths is None or not os.path.exists(paths[0]):
+        return {"success": False, "message": "Upload not found or expired."}
+    try:
+        meta = _read_meta(paths[0])
+    except FileNotFoundError:
+        return {"success": False, "message": "Upload not found or expired."}
+    return {"success": True, "data": meta if include_meta else _public(meta)}
+
+
+_NOT_FOUND = {"success": False, "message": "Upload not found or expired.", "code": 404}
+
+
+def write_chunk(upload_id, offset, stream, length, checksum=None):
+    """
+    Appends 'length' bytes from 'stream' at 'offset'. The offset must equal the number of
+    bytes already stored, so a client that lost track can GET the upload and resume.
+    On a checksum mismatch or short read the chunk is discarded.
+    """
+    paths = _paths(upload_id)
+    if paths is None or not os.path.exists(paths[0]):
+        return dict(_NOT_FOUND)
+    meta_path, part_path = paths
+    if length is None or length <= 0:
+        return {"success": False, "message": "Chunk must have a Content-Length.", "code": 411}
+    if length > upload_chunk_bytes:
+        return {"success": False, "message": f"Chunks may be at most {upload_chunk_bytes} bytes.", "code": 413}
+
+    try:
+        with open(part_path, "r+b") as part:
+            # One writer per upload at a time, even across workers
+            fcntl.flock(part, fcntl.LOCK_EX)
+            meta = _read_meta(meta_path)
+            if offset != meta["offset"]:
+                return {"success": False, "message": "Offset does not match the stored upload.",
+                        "code": 409, "data": _public(meta)}
+            if offset + length > meta["size"]:
+                return {"success": False, "message": "Chunk runs past the declared file size.", "code": 413}
+
+            digest = hashlib.sha256()
+            part.seek(offset)
+            remaining = length
+            while remaining > 0:
+                block = stream.read(min(STREAM_BLOCK_BYTES, remaining))
+                if not block:
+                    break
+                part.write(block)
+                digest.update(block)
+                remaining -= len(block)
+
+            if remaining > 0 or (checksum and digest.hexdigest() != checksum.lower()):
+                part.truncate(offset)
+                message = "Chunk was incomplete." if remaining > 0 else "Chunk checksum mismatch."
+                return {"success": False, "message": message, "code": 400, "data": _public(meta)}
+
+            part.truncate(offset + length)
+            meta["offset"] = offset + length
+            _write_meta(meta_path, meta)
+            return {"success": True, "data": _public(meta)}
+    except FileNotFoundError:
+        # Finalized, discarded or expired between the existence check and here
+        return dict(_NOT_FOUND)
+
+
+def finalize_upload(upload_id):
+    """
+    Checks the upload is complete and intact, then hands back its metadata and bytes.
+    The stored files are kept so a failed analysis can be retried without sending the photo
+    again; the caller removes them with discard_upload() once the record is saved.
+    """
+    paths = _paths(upload_id)
+    if paths is None or not os.path.exists(paths[0]):
+        return dict(_NOT_FOUND)
+    meta_path, part_path = paths
+
+    try:
+        with open(part_path, "rb") as part:
+            fcntl.flock(part, fcntl.LOCK_EX)
+            meta = _read_meta(meta_path)
+            if meta["offset"] != meta["size"]:
+                return {"success": False, "message": "Upload is not complete.", "code": 409, "data": _public(meta)}
+            image_bytes = part.read()
+    except FileNotFoundError:
+        return dict(_NOT_FOUND)
+
+    if meta["sha256"] and hashlib.sha256(image_bytes).hexdigest() != meta["sha256"]:
+        discard_upload(upload_id)
+        return {"success": False, "message": "File checksum mismatch; please upload again.", "code": 422}
+
+    return {"success": True, "data": meta, "image_bytes": image_bytes}
+
+
+def discard_upload(upload_id):
+    paths = _paths(upload_id)
+    if paths is None:
+        return
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _expire_old_uploads():
+    cutoff = time.time() - upload_ttl_seconds
+    try:
+        names = os.listdir(upload_dir)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(upload_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
@@ -31,6 +31,18 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     };
 
+    // Every API call carries the user's hospital so the router can send a hospital's
+    // traffic to the same backend (keeping its caches warm). The server never uses this
+    // for access decisions; it is only a routing hint. It goes in the query string rather
+    // than a custom header, which would turn every simple GET into a CORS preflight.
+    const apiFetch = (url, options = {}) => {
+        const userData = getUserData();
+        if (!userData || !userData.hospital_id) return fetch(url, options);
+        const routed = new URL(url, window.location.href);
+        routed.searchParams.set("hospital_hint", String(userData.hospital_id));
+        return fetch(routed.toString(), options);
+    };
+
     const loadPage = async (page) => {
         try {
             const response = await fetch(`./pages/${page}.html`);
@@ -83,7 +95,7 @@ document.addEventListener("DOMContentLoaded", () => {
             const data = Object.fromEntries(new FormData(form).entries());
 
             try {
-                const response = await fetch(`${API_BASE_URL}/login`, {
+                const response = await apiFetch(`${API_BASE_URL}/login`, {
                     method: "POST",
                     headers: { "Content-Type": "application/json" },
                     body: JSON.stringify(data),
@@ -124,7 +136,7 @@ document.addEventListener("DOMContentLoaded", () => {
             }
         };
 
-        fetch(`${API_BASE_URL}/hospitals`).then(res => res.json()).then(result => {
+        apiFetch(`${API_BASE_URL}/hospitals`).then(res => res.json()).then(result => {
             if (result.success) {
                 hospitalSelect.innerHTML = result.data.map(h => `<option value="${h.id}">${h.name}</option>`).join('');
             }
@@ -143,7 +155,7 @@ document.addEventListener("DOMContentLoaded", () => {
             if (data.role !== 'bmc_commissioner') data.hospital_id = data.hospital;
 
             try {
-                const response = await fetch(`${API_BASE_URL}/register`, {
+                const response = await apiFetch(`${API_BASE_URL}/register`, {
                     method: "POST",
                     headers: { "Content-Type": "application/json" },
                     body: JSON.stringify(data),
@@ -166,6 +178,224 @@ document.addEventListener("DOMContentLoaded", () => {
         });
     };
 
+    // --- RESUMABLE PHOTO UPLOAD ---
+
+    const UPLOAD_MAX_ATTEMPTS = 5;
+
+    const sha256Hex = async (buffer) => {
+        // crypto.subtle is only available on secure origins; checksums are optional on the server
+        if (!window.crypto || !window.crypto.subtle) return null;
+        const digest = await window.crypto.subtle.digest("SHA-256", buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, "0")).join("");
+    };
+
+    const wait = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+    // Server errors, "still processing" and "hospital busy" are worth retrying; other 4xx responses are final
+    const isRetryableStatus = (status) => status >= 500 || status === 409 || status === 429;
+
+    // Resolves with the server's result (plus httpStatus) on success or a final rejection.
+    // Throws on network errors and retryable statuses, so the caller can try again later.
+    const uploadPhotoResumable = async (file, roomId, cleanerId, onProgress, idempotencyKey = null) => {
+        // An interrupted upload of the same file is resumed from the server's stored offset
+        const resumeKey = `upload:${cleanerId}:${roomId}:${file.name}:${file.size}:${file.lastModified}`;
+        let uploadId = localStorage.getItem(resumeKey);
+        let offset = 0;
+        let chunkSize = 1024 * 1024;
+
+        if (uploadId) {
+            const response = await apiFetch(`${API_BASE_URL}/uploads/${uploadId}`);
+            const result = await response.json();
+            if (result.success) {
+                offset = result.data.offset;
+                chunkSize = result.data.chunk_size;
+            } else {
+                uploadId = null;
+            }
+        }
+
+        if (!uploadId) {
+            const response = await apiFetch(`${API_BASE_URL}/uploads`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({
+                    room_id: roomId, cleaner_id: cleanerId, filename: file.name,
+                    size: file.size, sha256: await sha256Hex(await file.arrayBuffer()),
+                }),
+            });
+            const result = await response.json();
+            if (!result.success) {
+                if (isRetryableStatus(response.status)) throw new Error(result.message || result.error || "Could not start upload.");
+                return { ...result, success: false, httpStatus: response.status };
+            }
+            uploadId = result.data.upload_id;
+            chunkSize = result.data.chunk_size;
+            localStorage.setItem(resumeKey, uploadId);
+        }
+
+        let attempts = 0;
+        while (offset < file.size) {
+            const chunk = await file.slice(offset, offset + chunkSize).arrayBuffer();
+            const headers = { "Content-Type": "application/octet-stream", "Upload-Offset": String(offset) };
+            const checksum = await sha256Hex(chunk);
+            if (checksum) headers["Upload-Checksum"] = `sha256 ${checksum}`;
+
+            let response, result;
+            try {
+                response = await apiFetch(`${API_BASE_URL}/uploads/${uploadId}`, { method: "PUT", headers, body: chunk });
+                result = await response.json();
+            } catch (error) {
+                response = null;
+            }
+
+            if (result && result.data) offset = result.data.offset;  // Also realigns us after a 409
+            if (result && result.success) {
+                attempts = 0;
+            } else if (response && response.status === 404) {
+                // The upload expired on the server; the next attempt starts a fresh one
+                localStorage.removeItem(resumeKey);
+                throw new Error("Upload expired. It will start again.");
+            } else if (response && response.status !== 400 && response.status !== 409 && !isRetryableStatus(response.status)) {
+                localStorage.removeItem(resumeKey);
+                return { ...result, success: false, httpStatus: response.status };
+            } else if (!response || response.status !== 409) {
+                // Network error, server error or a damaged chunk (400): resend after a pause
+                attempts += 1;
+                if (attempts >= UPLOAD_MAX_ATTEMPTS) throw new Error("Connection lost. Submit again to resume the upload.");
+                await wait(1000 * 2 ** attempts);
+            }
+            if (onProgress) onProgress(offset / file.size);
+        }
+
+        const finalizeHeaders = idempotencyKey ? { "Idempotency-Key": idempotencyKey } : {};
+        const response = await apiFetch(`${API_BASE_URL}/uploads/${uploadId}/finalize`, { method: "POST", headers: finalizeHeaders });
+        const result = await response.json();
+        // The server keeps the photo until it is saved, so only forget the upload once it cannot be retried
+        if (!isRetryableStatus(response.status)) localStorage.removeItem(resumeKey);
+        result.httpStatus = response.status;
+        return result;
+    };
+
+    // --- OFFLINE SUBMISSION QUEUE ---
+    // Submissions are stored in IndexedDB first and sent in the background, so a dropped
+    // connection never loses a photo. Each one carries an Idempotency-Key, so a replay
+    // after an unclear failure is recognised by the server instead of saved twice.
+
+    const QUEUE_DB = "smart-hospital";
+    const QUEUE_STORE = "pending-submissions";
+    const QUEUE_BATCH_SIZE = 3;
+    const QUEUE_FLUSH_INTERVAL_MS = 30000;
+    let queueFlushing = false;
+    let queueTimerStarted = false;
+
+    const newIdempotencyKey = () => {
+        if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID().replace(/-/g, "");
+        return Array.from({ length: 32 }, () => Math.floor(Math.random() * 16).toString(16)).join("");
+    };
+
+    const openQueue = () => new Promise((resolve, reject) => {
+        const request = indexedDB.open(QUEUE_DB, 1);
+        request.onupgradeneeded = () => request.result.createObjectStore(QUEUE_STORE, { keyPath: "key" });
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+
+    const queueRequest = async (mode, action) => {
+        const db = await openQueue();
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(QUEUE_STORE, mode);
+            const request = action(tx.objectStore(QUEUE_STORE));
+            tx.oncomplete = () => { db.close(); resolve(request.result); };
+            tx.onerror = () => { db.close(); reject(tx.error); };
+        });
+    };
+
+    const enqueueSubmission = (submission) => queueRequest("readwrite", store => store.put(submission));
+    const removeSubmission = (key) => queueRequest("readwrite", store => store.delete(key));
+    const listSubmissions = () => queueRequest("readonly", store => store.getAll());
+
+    const updateQueueBadge = async () => {
+        const badge = document.getElementById("queue-status");
+        if (!badge) return;
+        const pending = (await listSubmissions()).length;
+        badge.textContent = pending ? `${pending} submission(s) waiting to be sent` : "";
+        badge.classList.toggle("hidden", pending === 0);
+    };
+
+    const sendSubmission = async (submission) => {
+        const file = new File([submission.photo], submission.filename, { lastModified: submission.lastModified });
+        const result = await uploadPhotoResumable(file, submission.room_id, submission.cleaner_id, null, submission.key);
+        // Server errors, "still processing" and "hospital busy" are retried later with the same key
+        if (isRetryableStatus(result.httpStatus)) {
+            throw new Error(result.message || result.error);
+        }
+        // A rejected submission (cleaner without a hospital, photo over the size limit, bad room)
+        // will never succeed, so it is dropped and reported instead of blocking the queue
+        await removeSubmission(submission.key);
+        return result;
+    };
+
+    const flushQueue = async () => {
+        if (queueFlushing || !navigator.onLine) return;
+        queueFlushing = true;
+        try {
+            const pending = (await listSubmissions()).sort((a, b) => a.queued_at - b.queued_at);
+            for (let i = 0; i < pending.length; i += QUEUE_BATCH_SIZE) {
+                const batch = pending.slice(i, i + QUEUE_BATCH_SIZE);
+                const outcomes = await Promise.allSettled(batch.map(sendSubmission));
+                outcomes.forEach((outcome, index) => {
+                    if (outcome.status === "fulfilled") {
+                        const result = outcome.value;
+                        if (result.success) showMessage(`Room ${batch[index].room_id} submitted for verification.`);
+                        else showMessage(`Room ${batch[index].room_id}: ${result.message || result.error || "Submission rejected."}`, true);
+                    }
+                });
+                // Stop for now if the network went away mid-batch; the rest stay queued
+                if (outcomes.some(outcome => outcome.status === "rejected")) break;
+            }
+        } finally {
+            queueFlushing = false;
+            updateQueueBadge();
+        }
+    };
+
+    const startQueueFlushing = () => {
+        if (queueTimerStarted) return;
+        queueTimerStarted = true;
+        window.addEventListener("online", flushQueue);
+        setInterval(flushQueue, QUEUE_FLUSH_INTERVAL_MS);
+    };
+
+    // --- TASK LIST DELTA SYNC ---
+    // The last task list and its sync cursor are kept in localStorage, so the page renders
+    // offline and only asks the server for tasks that changed since the last visit.
+
+    const loadCachedTasks = (cleanerId) => {
+        try {
+            return JSON.parse(localStorage.getItem(`tasks:${cleanerId}`)) || { cursor: null, tasks: {} };
+        } catch (e) {
+            return { cursor: null, tasks: {} };
+        }
+    };
+
+    const syncTasks = async (cleanerId) => {
+        const cached = loadCachedTasks(cleanerId);
+        const since = cached.cursor ? `?since=${encodeURIComponent(cached.cursor)}` : "";
+        const response = await apiFetch(`${API_BASE_URL}/tasks/${cleanerId}${since}`);
+        const result = await response.json();
+        if (response.status === 400 && cached.cursor) {
+            // Cursor no longer accepted; start over with a full sync
+            localStorage.removeItem(`tasks:${cleanerId}`);
+            return syncTasks(cleanerId);
+        }
+        if (!result.success) throw new Error(result.message || result.error || "Failed to load tasks");
+
+        const tasks = result.full ? {} : cached.tasks;
+        result.data.forEach(task => { tasks[task.id] = task; });
+        localStorage.setItem(`tasks:${cleanerId}`, JSON.stringify({ cursor: result.cursor, tasks }));
+        return Object.values(tasks);
+    };
+
     const setupCleanerDashboard = () => {
         // Add user welcome section
         const userData = getUserData();
@@ -232,16 +462,17 @@ document.addEventListener("DOMContentLoaded", () => {
                 spinner.classList.remove('hidden');
                 buttonText.textContent = 'Submitting...';
                 
-                const formData = new FormData();
-                formData.append('room_id', uploadForm.querySelector('#room').value);
-                formData.append('after_photo', uploadForm.querySelector('#photo').files[0]);
-                formData.append('cleaner_id', getUserData().user_id);
+                const roomId = uploadForm.querySelector('#room').value;
+                const photo = uploadForm.querySelector('#photo').files[0];
                 
                 try {
-                    const response = await fetch(`${API_BASE_URL}/verify_room`, { method: "POST", body: formData });
-                    const result = await response.json();
-                    if (!result.success) throw new Error(result.error || "Submission failed.");
-                    showMessage("Work submitted for verification.");
+                    // Queue first so the photo survives a dropped connection or a closed tab
+                    await enqueueSubmission({
+                        key: newIdempotencyKey(), room_id: roomId, cleaner_id: getUserData().user_id,
+                        photo, filename: photo.name, lastModified: photo.lastModified, queued_at: Date.now(),
+                    });
+                    showMessage(navigator.onLine ? "Work queued; sending now." : "You are offline. Work will be sent when the connection returns.");
+                    flushQueue();
                     uploadForm.reset();
                     // Reset file upload area
                     if (fileUploadArea) {
@@ -262,10 +493,14 @@ document.addEventListener("DOMContentLoaded", () => {
             });
         }
         
+        startQueueFlushing();
+        flushQueue();
+        updateQueueBadge();
+
         const taskListDiv = document.getElementById("task-list");
         if (taskListDiv) {
-            fetch(`${API_BASE_URL}/tasks/${getUserData().user_id}`).then(res => res.json()).then(result => {
-                if (!result.success || result.data.length === 0) {
+            const renderTasks = (tasks) => {
+                if (tasks.length === 0) {
                     taskListDiv.innerHTML = `
                         <div class="text-center py-8">
                             <i class="fas fa-clipboard-list text-3xl text-gray-500 mb-3"></i>
@@ -275,7 +510,8 @@ document.addEventListener("DOMContentLoaded", () => {
                     `;
                     return;
                 }
-                taskListDiv.innerHTML = result.data.map(task => `
+                tasks.sort((a, b) => new Date(a.assignment_date) - new Date(b.assignment_date));
+                taskListDiv.innerHTML = tasks.map(task => `
                     <div class="p-4 glass-effect rounded-lg border border-gray-700 transition-all duration-300 hover:border-blue-500/50">
                         <div class="flex justify-between items-center">
                             <h4 class="font-bold text-lg text-white">${task.room_id}</h4>
@@ -285,7 +521,14 @@ document.addEventListener("DOMContentLoaded", () => {
                         <p class="mt-2 text-gray-300 bg-gray-800/50 p-2 rounded-md">${task.notes || 'No notes provided.'}</p>
                     </div>
                 `).join('');
-            }).catch(error => {
+            };
+
+            const cleanerId = getUserData().user_id;
+            const cachedTasks = Object.values(loadCachedTasks(cleanerId).tasks);
+            if (cachedTasks.length) renderTasks(cachedTasks);
+
+            syncTasks(cleanerId).then(renderTasks).catch(error => {
+                if (cachedTasks.length) return;  // Keep showing the last synced list while offline
                 taskListDiv.innerHTML = `
                     <div class="text-center py-8">
                         <i class="fas fa-exclamation-triangle text-2xl text-red-400 mb-3"></i>
@@ -321,7 +564,7 @@ document.addEventListener("DOMContentLoaded", () => {
         const cleanerSelect = document.getElementById("cleaner");
         
         if (cleanerSelect) {
-            fetch(`${API_BASE_URL}/cleaners`, { headers: { 'Authorization': `Bearer ${getToken()}` }})
+            apiFetch(`${API_BASE_URL}/cleaners`, { headers: { 'Authorization': `Bearer ${getToken()}` }})
             .then(res => res.json()).then(result => {
                 if (result.success && result.data.length > 0) {
                     cleanerSelect.innerHTML = '<option value="" disabled selected>Select a cleaner</option>' + 
@@ -351,7 +594,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 data.cleaner_id = data.cleaner;
 
                 try {
-                    const response = await fetch(`${API_BASE_URL}/assign_task`, {
+                    const response = await apiFetch(`${API_BASE_URL}/assign_task`, {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
                         body: JSON.stringify(data)
@@ -376,7 +619,7 @@ document.addEventListener("DOMContentLoaded", () => {
         const approvalList = document.getElementById("approval-list");
         const loadApprovals = async () => {
             try {
-                const response = await fetch(`${API_BASE_URL}/dashboard`, { headers: { 'Authorization': `Bearer ${getToken()}` } });
+                const response = await apiFetch(`${API_BASE_URL}/dashboard`, { headers: { 'Authorization': `Bearer ${getToken()}` } });
                 const result = await response.json();
                 if (!result.success || result.data.length === 0) {
                     approvalList.innerHTML = `
@@ -436,7 +679,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 allButtons.forEach(btn => btn.disabled = true);
                 
                 try {
-                    const response = await fetch(`${API_BASE_URL}/approve`, {
+                    const response = await apiFetch(`${API_BASE_URL}/approve`, {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${getToken()}` },
                         body: JSON.stringify({ record_id: parseInt(recordId), new_status: newStatus })
@@ -502,7 +745,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 buttonText.textContent = 'Generating Report...';
                 
                 try {
-                    const response = await fetch(`${API_BASE_URL}/report/weekly`, { headers: { 'Authorization': `Bearer ${getToken()}` } });
+                    const response = await apiFetch(`${API_BASE_URL}/report/weekly`, { headers: { 'Authorization': `Bearer ${getToken()}` } });
                     if (!response.ok) throw new Error((await response.json()).error);
                     const blob = await response.blob();
                     const url = window.URL.createObjectURL(blob);